@@ -0,0 +1,99 @@
+"""Bytes-on-wire and CPU-per-request for the response compression layer.
+
+Compares, for each payload:
+  * identity      - what every response cost before compression was added
+  * precompressed - embed pages / static bundles served from PrecompressedBody
+  * dynamic       - CompressionMiddleware compressing on the fly
+
+Run from the backend directory:
+    python benchmarks/compression_bench.py
+    python benchmarks/compression_bench.py --url http://localhost:8001/api/embed/donate/<org_id>
+"""
+import argparse
+import json
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from compression import PrecompressedBody, compress, supported_encodings  # noqa: E402
+
+
+def sample_transactions(count: int = 100) -> bytes:
+    """A transactions list shaped like the donation records the API stores"""
+    records = [
+        {
+            "id": str(uuid.uuid4()),
+            "organization_id": str(uuid.UUID(int=1)),
+            "amount": 25.0 + i,
+            "donor_email": f"donor{i}@example.org",
+            "donor_name": f"Donor {i}",
+            "transaction_token": str(uuid.uuid4()),
+            "status": "completed",
+            "payment_method": "blackbaud_checkout",
+            "created_at": datetime.utcnow().isoformat(),
+            "test_mode": True,
+        }
+        for i in range(count)
+    ]
+    return json.dumps(records).encode()
+
+
+def load_payloads(urls) -> dict:
+    payloads = {}
+    for path in sorted((BACKEND_DIR / "static").iterdir()):
+        if path.is_file():
+            payloads[f"static/{path.name}"] = path.read_bytes()
+    payloads["transactions (100 rows)"] = sample_transactions()
+    if urls:
+        import httpx
+        for url in urls:
+            response = httpx.get(url, headers={"Accept-Encoding": "identity"}, timeout=30.0)
+            response.raise_for_status()
+            payloads[url] = response.content
+    return payloads
+
+
+def cpu_per_call(func, iterations: int) -> float:
+    """Average process CPU time per call, in microseconds"""
+    start = time.process_time()
+    for _ in range(iterations):
+        func()
+    return (time.process_time() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", action="append", default=[], help="also benchmark a live response body")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    rows = []
+    for name, body in load_payloads(args.url).items():
+        precompressed = PrecompressedBody(body)
+        rows.append((name, "identity", len(body), 0.0))
+        for encoding in supported_encodings():
+            rows.append((
+                name, f"{encoding} precompressed", len(precompressed.variants[encoding]),
+                cpu_per_call(lambda: precompressed.select(encoding), args.iterations),
+            ))
+            rows.append((
+                name, f"{encoding} dynamic", len(compress(body, encoding)),
+                cpu_per_call(lambda: compress(body, encoding), args.iterations),
+            ))
+
+    width = max(len(row[0]) for row in rows)
+    print(f"{'payload':<{width}}  {'variant':<18} {'bytes':>9} {'saved':>7} {'cpu/req (us)':>13}")
+    identity_size = {}
+    for name, variant, size, cpu in rows:
+        identity_size.setdefault(name, size)
+        saved = 1 - size / identity_size[name] if identity_size[name] else 0
+        print(f"{name:<{width}}  {variant:<18} {size:>9} {saved:>7.1%} {cpu:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Per-request cost of reading a cached organization: raw dict vs OrgSnapshot.
+
+Each "request" does what the donate/checkout and form-config handlers need
+from the organization: the effective access token and merchant ID for the
+current mode, and the sorted preset amounts. The dict variants reproduce the
+handlers before OrgSnapshot, with and without the Organization model rebuild
+that get_organization and create_donation_checkout used to do.
+
+Run from the backend directory:
+    python benchmarks/org_snapshot_bench.py
+"""
+import argparse
+import sys
+import timeit
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from org_snapshot import OrgSnapshot  # noqa: E402
+
+try:
+    from server import Organization  # noqa: E402
+except Exception:  # server.py needs its .env (MONGO_URL etc.) to import
+    Organization = None
+
+
+def sample_document(legacy: bool) -> dict:
+    """An organization document; legacy ones keep the token under bbms_config"""
+    doc = {
+        "id": str(uuid.uuid4()),
+        "name": "Example Food Bank",
+        "admin_email": "admin@example.org",
+        "admin_password_hash": "0" * 64,
+        "test_mode": True,
+        "bb_merchant_id": str(uuid.uuid4()),
+        "form_settings": {
+            "preset_amounts": [500, 25, 250, 50, 100],
+            "custom_amount_enabled": True,
+            "required_fields": ["name", "email"],
+            "organization_description": "Help us make a difference",
+            "thank_you_message": "Thank you for your generous donation!",
+        },
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow(),
+    }
+    if legacy:
+        doc["bbms_config"] = {"access_token": "gAAAAA" + "x" * 180}
+    else:
+        doc["bb_access_token"] = "gAAAAA" + "x" * 180
+        doc["bb_test_merchant_id"] = str(uuid.uuid4())
+    return doc
+
+
+def dict_request(org: dict):
+    encrypted_access_token = org.get("bb_access_token")
+    if not encrypted_access_token:
+        bbms_config = org.get("bbms_config", {})
+        encrypted_access_token = bbms_config.get("access_token")
+    if org.get("test_mode", True):
+        merchant_id = org.get("bb_test_merchant_id") or org.get("bb_merchant_id")
+    else:
+        merchant_id = org.get("bb_production_merchant_id") or org.get("bb_merchant_id")
+    presets = sorted(org.get("form_settings", {}).get("preset_amounts", [25, 50, 100]))
+    return encrypted_access_token, merchant_id, presets
+
+
+def model_request(org: dict):
+    organization = Organization(**org)
+    presets = sorted(organization.form_settings.get("preset_amounts", [25, 50, 100]))
+    return organization.bb_access_token, organization.bb_merchant_id, presets
+
+
+def snapshot_request(org: OrgSnapshot):
+    return org.encrypted_access_token, org.merchant_id, org.preset_amounts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=200000)
+    args = parser.parse_args()
+
+    print(f"{'document':<8}  {'variant':<28} {'ns/request':>10}")
+    for label, legacy in (("current", False), ("legacy", True)):
+        doc = sample_document(legacy)
+        snapshot = OrgSnapshot.from_document(doc)
+        variants = [
+            ("dict probing", lambda: dict_request(doc)),
+            ("OrgSnapshot", lambda: snapshot_request(snapshot)),
+            ("OrgSnapshot build (per miss)", lambda: OrgSnapshot.from_document(doc)),
+        ]
+        if Organization is not None:
+            variants.insert(1, ("Organization(**doc) rebuild", lambda: model_request(doc)))
+        for name, func in variants:
+            number = args.number // 10 if "rebuild" in name else args.number
+            seconds = min(timeit.repeat(func, number=number, repeat=3))
+            print(f"{label:<8}  {name:<28} {seconds / number * 1e9:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
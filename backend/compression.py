@@ -0,0 +1,178 @@
+"""Response compression for the public endpoints.
+
+Cacheable bodies (rendered embed pages, static bundles) are compressed once
+when they are cached and served from memory in whichever encoding the client
+accepts. Everything else goes through CompressionMiddleware, which compresses
+dynamic responses on the fly once they are large enough to be worth it.
+"""
+import gzip
+import logging
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+BROTLI_AVAILABLE = brotli is not None
+
+# Precompressed variants are built once, so spend the CPU on the best ratio
+PRECOMPRESS_GZIP_LEVEL = 9
+PRECOMPRESS_BROTLI_QUALITY = 11
+# On-the-fly compression runs per request and has to stay cheap
+DYNAMIC_GZIP_LEVEL = 6
+DYNAMIC_BROTLI_QUALITY = 4
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "image/svg+xml",
+)
+
+
+def supported_encodings() -> tuple:
+    return ("br", "gzip") if BROTLI_AVAILABLE else ("gzip",)
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the best encoding we support from an Accept-Encoding header"""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[token] = quality
+    for encoding in supported_encodings():
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str, precompress: bool = False) -> bytes:
+    if encoding == "br":
+        quality = PRECOMPRESS_BROTLI_QUALITY if precompress else DYNAMIC_BROTLI_QUALITY
+        return brotli.compress(body, quality=quality)
+    if encoding == "gzip":
+        level = PRECOMPRESS_GZIP_LEVEL if precompress else DYNAMIC_GZIP_LEVEL
+        return gzip.compress(body, compresslevel=level, mtime=0)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def is_compressible(media_type: Optional[str]) -> bool:
+    return bool(media_type) and media_type.lower().startswith(COMPRESSIBLE_TYPES)
+
+
+def add_vary_accept_encoding(headers: MutableHeaders) -> None:
+    if "accept-encoding" not in headers.get("vary", "").lower():
+        headers.add_vary_header("Accept-Encoding")
+
+
+class PrecompressedBody:
+    """A response body together with its gzip and brotli encodings"""
+
+    __slots__ = ("identity", "variants")
+
+    def __init__(self, body: bytes):
+        self.identity = body
+        self.variants: Dict[str, bytes] = {
+            encoding: compress(body, encoding, precompress=True)
+            for encoding in supported_encodings()
+        }
+
+    def select(self, accept_encoding: Optional[str]) -> tuple:
+        """Return (encoding, bytes) for the client; encoding is None for identity"""
+        encoding = choose_encoding(accept_encoding)
+        if encoding and len(self.variants[encoding]) < len(self.identity):
+            return encoding, self.variants[encoding]
+        return None, self.identity
+
+
+def precompressed_response(
+    request: Optional[Request],
+    body: PrecompressedBody,
+    media_type: str,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    accept_encoding = request.headers.get("accept-encoding") if request is not None else None
+    encoding, content = body.select(accept_encoding)
+    response_headers = dict(headers or {})
+    response_headers["Vary"] = "Accept-Encoding"
+    if encoding:
+        response_headers["Content-Encoding"] = encoding
+    return Response(content=content, media_type=media_type, headers=response_headers)
+
+
+class CompressionMiddleware:
+    """Compress complete (non-streaming) responses above minimum_size.
+
+    Responses that already carry a Content-Encoding, such as the precompressed
+    embed pages, pass through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start_message["headers"])
+            body = message.get("body", b"")
+            if (
+                encoding is None
+                or message.get("more_body", False)
+                or "content-encoding" in headers
+                or not is_compressible(headers.get("content-type"))
+                or len(body) < self.minimum_size
+            ):
+                # No acceptable encoding, streaming, already encoded or not worth it
+                passthrough = True
+                if is_compressible(headers.get("content-type")) and "content-encoding" not in headers:
+                    add_vary_accept_encoding(headers)
+                await send(start_message)
+                await send(message)
+                return
+
+            try:
+                compressed = compress(body, encoding)
+            except Exception as e:
+                logging.error(f"Response compression failed: {e}")
+                compressed = None
+            if compressed is not None and len(compressed) < len(body):
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(compressed))
+                body = compressed
+            add_vary_accept_encoding(headers)
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
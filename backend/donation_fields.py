@@ -0,0 +1,63 @@
+"""Storage types for donation amounts and timestamps.
+
+Donations store amount_cents (integer cents) and created_at as a naive UTC
+BSON datetime. API clients still see dollars: api_view() adds "amount" on read.
+"""
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import Any, Dict, Optional
+
+CENTS = Decimal(100)
+# Largest single gift accepted, in dollars; far inside int64 cents
+MAX_DONATION_AMOUNT = Decimal(10_000_000)
+
+
+def to_minor_units(amount: Any) -> Optional[int]:
+    """Dollars (number or numeric string) to integer cents; None stays None"""
+    if amount is None or amount == "":
+        return None
+    if isinstance(amount, bool):
+        raise ValueError(f"Invalid donation amount: {amount!r}")
+    try:
+        # str() first so 0.1 converts as 0.1, not as its binary approximation
+        value = Decimal(str(amount).strip().lstrip("$"))
+    except InvalidOperation:
+        raise ValueError(f"Invalid donation amount: {amount!r}")
+    if not value.is_finite():
+        raise ValueError(f"Invalid donation amount: {amount!r}")
+    if value.copy_abs() > MAX_DONATION_AMOUNT:
+        raise ValueError(f"Donation amount must not exceed {MAX_DONATION_AMOUNT:,}")
+    return int((value * CENTS).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_minor_units(cents: Optional[int]) -> Optional[float]:
+    return None if cents is None else cents / 100
+
+
+def parse_created_at(value: Any) -> datetime:
+    """A created_at (datetime or isoformat string) as a naive UTC datetime"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = (value - value.utcoffset()).replace(tzinfo=None)
+        return value
+    raise ValueError(f"Invalid created_at: {value!r}")
+
+
+def stored_amount_cents(donation: Dict) -> int:
+    """A stored donation's amount in cents, including legacy documents with "amount" in dollars"""
+    if donation.get("amount_cents") is not None:
+        return donation["amount_cents"]
+    try:
+        return to_minor_units(donation.get("amount")) or 0
+    except ValueError:
+        return 0
+
+
+def api_view(donation: Dict) -> Dict:
+    """A stored donation as API clients see it, with the amount in dollars"""
+    if "amount_cents" in donation:
+        donation = dict(donation)
+        donation["amount"] = from_minor_units(donation["amount_cents"])
+    return donation
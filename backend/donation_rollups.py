@@ -0,0 +1,261 @@
+"""Per-organization, per-day totals of completed donations.
+
+donation_daily_rollups holds one document per organization and UTC day:
+
+    organization_id, day (midnight UTC)
+    count, amount_cents, max_amount_cents
+    test_count, test_amount_cents, live_count, live_amount_cents
+
+DonationRollups.add() applies $inc/$max upserts for donations that were just
+inserted as, or moved to, completed. Rollups are only read for organizations
+that have been rebuilt from their donations (recorded in
+donation_rollup_builds); until then stats are summed from the donations on
+each read. Rebuild after deploying, and to repair failed updates:
+
+    python donation_rollups.py [--org ORG_ID ...] [--concurrency 4]
+
+Run it when traffic is low: donations completed while their organization is
+being rebuilt may be missed or counted twice.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo import ASCENDING, ReplaceOne, UpdateOne
+
+from donation_fields import from_minor_units, parse_created_at, stored_amount_cents
+from migrate_donation_types import LEGACY_FILTER
+
+ROLLUPS_COLLECTION = "donation_daily_rollups"
+# One document per organization whose rollups have been built from its donations
+ROLLUP_BUILDS_COLLECTION = "donation_rollup_builds"
+COUNTERS = ("count", "amount_cents", "test_count", "test_amount_cents", "live_count", "live_amount_cents")
+
+
+def rollup_day(created_at: datetime) -> datetime:
+    return datetime(created_at.year, created_at.month, created_at.day)
+
+
+def _counters(amount_cents: int, test_mode: bool) -> Dict[str, int]:
+    mode = "test" if test_mode else "live"
+    return {
+        "count": 1,
+        "amount_cents": amount_cents,
+        f"{mode}_count": 1,
+        f"{mode}_amount_cents": amount_cents,
+    }
+
+
+class DonationRollups:
+    def __init__(self, get_db: Callable):
+        self.get_db = get_db
+        self.failures = 0
+        self.unbuilt_reads = 0
+        # Organizations known to have been rebuilt
+        self._built: Set[str] = set()
+
+    def get_collection(self):
+        return self.get_db()[ROLLUPS_COLLECTION]
+
+    async def is_built(self, organization_id: str) -> bool:
+        """Whether the organization's rollups have been rebuilt from its donations"""
+        if organization_id in self._built:
+            return True
+        if await self.get_db()[ROLLUP_BUILDS_COLLECTION].find_one({"_id": organization_id}) is None:
+            return False
+        self._built.add(organization_id)
+        return True
+
+    async def add(self, donations: Iterable[Dict]) -> None:
+        """Count donations that were just inserted as, or moved to, completed"""
+        days: Dict[Tuple[str, datetime], Dict] = {}
+        for donation in donations:
+            if donation.get("status") != "completed":
+                continue
+            try:
+                # Donations the type migration hasn't reached yet still count
+                created_at = parse_created_at(donation.get("created_at"))
+            except ValueError:
+                continue
+            amount_cents = stored_amount_cents(donation)
+            day = days.setdefault(
+                (donation["organization_id"], rollup_day(created_at)),
+                {"inc": dict.fromkeys(COUNTERS, 0), "max": 0},
+            )
+            for counter, value in _counters(amount_cents, bool(donation.get("test_mode"))).items():
+                day["inc"][counter] += value
+            day["max"] = max(day["max"], amount_cents)
+        if not days:
+            return
+        operations = [
+            UpdateOne(
+                {"organization_id": organization_id, "day": day},
+                {
+                    # Zeros too, so every rollup document has every counter
+                    "$inc": totals["inc"],
+                    "$max": {"max_amount_cents": totals["max"]},
+                    "$set": {"updated_at": datetime.utcnow()},
+                },
+                upsert=True,
+            )
+            for (organization_id, day), totals in days.items()
+        ]
+        try:
+            await self.get_collection().bulk_write(operations, ordered=False)
+        except Exception as e:
+            # The donations themselves are stored; a rebuild repairs the totals
+            self.failures += 1
+            logging.error(f"Updating {len(operations)} donation rollups failed: {e}")
+
+    async def daily(self, organization_id: str, since: Optional[datetime] = None) -> List[Dict]:
+        """The organization's rollup documents, oldest day first"""
+        if not await self.is_built(organization_id):
+            # Summed from donations, since incremental updates alone miss
+            # everything recorded before the rollups existed
+            self.unbuilt_reads += 1
+            days = await daily_totals(self.get_db(), organization_id)
+            first = rollup_day(since) if since is not None else None
+            return [
+                {"organization_id": organization_id, "day": day, **days[day]}
+                for day in sorted(days)
+                if first is None or day >= first
+            ]
+        query: Dict = {"organization_id": organization_id}
+        if since is not None:
+            query["day"] = {"$gte": rollup_day(since)}
+        return await self.get_collection().find(query, {"_id": 0}).sort("day", ASCENDING).to_list(None)
+
+    async def stats(self, organization_id: str, recent_days: int = 7) -> Dict:
+        """Dashboard totals; recent covers the last recent_days UTC days, today included"""
+        days = await self.daily(organization_id)
+        recent_since = rollup_day(datetime.utcnow()) - timedelta(days=recent_days - 1)
+        totals = dict.fromkeys(COUNTERS, 0)
+        recent_count = recent_amount_cents = max_amount_cents = 0
+        for day in days:
+            for counter in COUNTERS:
+                totals[counter] += day.get(counter, 0)
+            max_amount_cents = max(max_amount_cents, day.get("max_amount_cents", 0))
+            if day["day"] >= recent_since:
+                recent_count += day.get("count", 0)
+                recent_amount_cents += day.get("amount_cents", 0)
+        return {
+            "total_donations": totals["count"],
+            "total_amount": from_minor_units(totals["amount_cents"]),
+            "recent_count": recent_count,
+            "recent_amount": from_minor_units(recent_amount_cents),
+            "recent_days": recent_days,
+            "largest_amount": from_minor_units(max_amount_cents),
+            "test": {"count": totals["test_count"], "amount": from_minor_units(totals["test_amount_cents"])},
+            "live": {"count": totals["live_count"], "amount": from_minor_units(totals["live_amount_cents"])},
+        }
+
+
+def daily_view(day: Dict) -> Dict:
+    """A rollup document as API clients see it, with amounts in dollars"""
+    return {
+        "day": day["day"].date().isoformat(),
+        "count": day.get("count", 0),
+        "amount": from_minor_units(day.get("amount_cents", 0)),
+        "largest_amount": from_minor_units(day.get("max_amount_cents", 0)),
+        "test_count": day.get("test_count", 0),
+        "live_count": day.get("live_count", 0),
+    }
+
+
+async def daily_totals(db, organization_id: str) -> Dict[datetime, Dict]:
+    """The organization's rollup counters per day, computed from its donations"""
+    completed = {"organization_id": organization_id, "status": "completed"}
+    is_test = {"$eq": [{"$ifNull": ["$test_mode", False]}, True]}
+    amount = {"$ifNull": ["$amount_cents", 0]}
+    groups = await db["donations"].aggregate([
+        {"$match": {**completed, "created_at": {"$type": "date"}, "amount": {"$exists": False}}},
+        {"$group": {
+            "_id": {"$dateFromParts": {
+                "year": {"$year": "$created_at"},
+                "month": {"$month": "$created_at"},
+                "day": {"$dayOfMonth": "$created_at"},
+            }},
+            "count": {"$sum": 1},
+            "amount_cents": {"$sum": amount},
+            "max_amount_cents": {"$max": amount},
+            "test_count": {"$sum": {"$cond": [is_test, 1, 0]}},
+            "test_amount_cents": {"$sum": {"$cond": [is_test, amount, 0]}},
+        }},
+    ]).to_list(None)
+    days: Dict[datetime, Dict] = {}
+    for group in groups:
+        day = days[group.pop("_id")] = group
+        day["live_count"] = day["count"] - day["test_count"]
+        day["live_amount_cents"] = day["amount_cents"] - day["test_amount_cents"]
+
+    # Donations the type migration hasn't converted yet are added up here
+    legacy = db["donations"].find(
+        {**completed, **LEGACY_FILTER}, {"_id": 0, "created_at": 1, "amount": 1, "amount_cents": 1, "test_mode": 1}
+    )
+    async for donation in legacy:
+        try:
+            day_start = rollup_day(parse_created_at(donation.get("created_at")))
+        except ValueError:
+            continue
+        amount_cents = stored_amount_cents(donation)
+        day = days.setdefault(day_start, {**dict.fromkeys(COUNTERS, 0), "max_amount_cents": 0})
+        for counter, value in _counters(amount_cents, bool(donation.get("test_mode"))).items():
+            day[counter] += value
+        day["max_amount_cents"] = max(day["max_amount_cents"], amount_cents)
+    return days
+
+
+async def rebuild_organization(db, organization_id: str) -> int:
+    """Recompute one organization's rollups from its donations; returns the number of days"""
+    days = await daily_totals(db, organization_id)
+    now = datetime.utcnow()
+    collection = db[ROLLUPS_COLLECTION]
+    # Replaced day by day, so readers never see an empty organization and
+    # concurrent rebuilds of one organization don't collide on the unique index
+    if days:
+        await collection.bulk_write([
+            ReplaceOne(
+                {"organization_id": organization_id, "day": day},
+                {"organization_id": organization_id, "day": day, **totals, "updated_at": now},
+                upsert=True,
+            )
+            for day, totals in days.items()
+        ], ordered=False)
+    await collection.delete_many({"organization_id": organization_id, "day": {"$nin": list(days)}})
+    await db[ROLLUP_BUILDS_COLLECTION].replace_one(
+        {"_id": organization_id}, {"_id": organization_id, "rebuilt_at": now, "days": len(days)}, upsert=True
+    )
+    return len(days)
+
+
+async def rebuild_rollups(db, organization_ids: Optional[List[str]] = None, concurrency: int = 4) -> Dict[str, int]:
+    """Rebuild rollups for the given organizations (default: all), concurrency at a time"""
+    if organization_ids is None:
+        organization_ids = await db["donations"].distinct("organization_id")
+    semaphore = asyncio.Semaphore(concurrency)
+    results: Dict[str, int] = {}
+
+    async def rebuild(organization_id: str) -> None:
+        async with semaphore:
+            results[organization_id] = await rebuild_organization(db, organization_id)
+            logging.info(f"Rebuilt {results[organization_id]} daily rollups for {organization_id}")
+
+    await asyncio.gather(*(rebuild(organization_id) for organization_id in organization_ids))
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    import server
+
+    parser = argparse.ArgumentParser(description="Rebuild donation_daily_rollups from the donations collection")
+    parser.add_argument("--org", action="append", dest="organization_ids", help="only this organization (repeatable)")
+    parser.add_argument("--concurrency", type=int, default=4, help="organizations rebuilt in parallel")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    results = asyncio.run(rebuild_rollups(server.db, args.organization_ids, args.concurrency))
+    print(f"organizations: {len(results)}, days: {sum(results.values())}, {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,213 @@
+"""The donations collection: one schema for every way a donation is recorded.
+
+Documents are built by new_donation():
+
+    id                unique donation id (also what the donor's client polls)
+    organization_id
+    amount_cents      integer cents (donation_fields.py)
+    donor_name, donor_email
+    status            pending (checkout session), pending_verification,
+                      completed, failed, verification_failed
+    payment_method    blackbaud_checkout, blackbaud_checkout_test or
+                      blackbaud_checkout_session
+    created_at        BSON datetime
+    test_mode
+    and, depending on how the donation came in: session_id (checkout session),
+    transaction_token, transaction_id (Blackbaud's), idempotency_key,
+    verification (verification_worker.py), completed_at, metadata
+
+Request handlers read and write donations through DonationStore; each view
+is one indexed query (see indexes.py).
+"""
+import base64
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bson import json_util
+from pymongo import DESCENDING, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from donation_fields import api_view
+from donation_rollups import DonationRollups
+from donation_writer import DUPLICATE_KEY, DonationWriteBehind
+
+CHECKOUT_SESSION = "blackbaud_checkout_session"
+
+
+class DonationConflict(Exception):
+    """The transaction token is already recorded for a donation this request can't see"""
+
+
+def new_donation(
+    organization_id: str,
+    amount_cents: Optional[int],
+    donor_name: Optional[str],
+    donor_email: Optional[str],
+    status: str,
+    payment_method: str,
+    test_mode: Optional[bool] = None,
+    **fields,
+) -> Dict:
+    """A donation document in the unified schema; fields adds the optional ones"""
+    donation = {
+        "id": str(uuid.uuid4()),
+        "organization_id": organization_id,
+        "amount_cents": amount_cents,
+        "donor_email": donor_email,
+        "donor_name": donor_name,
+        "status": status,
+        "payment_method": payment_method,
+        "created_at": datetime.utcnow(),
+        "test_mode": test_mode,
+    }
+    donation.update({name: value for name, value in fields.items() if value is not None})
+    return donation
+
+
+def idempotency_filter(organization_id: str, transaction_token: str, idempotency_key: Optional[str] = None) -> Dict:
+    # A donation is recorded once per Blackbaud transaction token, or per
+    # Idempotency-Key when the client sends one; both are backed by unique indexes
+    if idempotency_key:
+        return {"organization_id": organization_id, "idempotency_key": idempotency_key}
+    # Tokens are unique on their own; the org only keeps lookups within it
+    return {"transaction_token": transaction_token, "organization_id": organization_id}
+
+
+def recorded_query(organization_id: str, transaction_token: str, idempotency_key: Optional[str] = None) -> Dict:
+    """Matches a donation recorded under either the transaction token or the Idempotency-Key"""
+    queries = [idempotency_filter(organization_id, transaction_token)]
+    if idempotency_key:
+        queries.append(idempotency_filter(organization_id, transaction_token, idempotency_key))
+    return queries[0] if len(queries) == 1 else {"$or": queries}
+
+
+def encode_cursor(donation: Dict) -> str:
+    """An opaque continuation token for the page after this donation"""
+    # Extended JSON keeps created_at's BSON type through the round trip
+    position = json_util.dumps([donation["created_at"], donation["id"]])
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[object, str]:
+    """(created_at, id) from encode_cursor(); raises ValueError if it isn't one"""
+    try:
+        created_at, donation_id = json_util.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(donation_id, str):
+        raise ValueError("Invalid cursor")
+    return created_at, donation_id
+
+
+class DonationStore:
+    def __init__(
+        self,
+        get_collection: Callable,
+        writer: Optional[DonationWriteBehind] = None,
+        rollups: Optional[DonationRollups] = None,
+    ):
+        self.get_collection = get_collection
+        # Set when donations go through the write-behind journal, which
+        # updates the rollups itself as it flushes
+        self.writer = writer
+        self.rollups = rollups
+
+    async def record(self, donation: Dict) -> Dict:
+        """Store a donation; on a replay returns the donation recorded first instead"""
+        organization_id, transaction_token = donation["organization_id"], donation["transaction_token"]
+        if self.writer is not None:
+            # Same-worker retries are deduplicated here; cross-worker ones by
+            # the unique indexes when the batch is flushed. The id key lets
+            # status lookups see the donation before the flush.
+            return await self.writer.submit(donation, keys=(f"{organization_id}:{transaction_token}", donation["id"]))
+        collection = self.get_collection()
+        idempotency_key = donation.get("idempotency_key")
+        try:
+            existing = await collection.find_one_and_update(
+                idempotency_filter(organization_id, transaction_token, idempotency_key),
+                {"$setOnInsert": donation},
+                upsert=True,
+                projection={"_id": 0},
+                return_document=ReturnDocument.BEFORE,
+            )
+        except DuplicateKeyError:
+            # Lost an upsert race with a concurrent retry, or the token was
+            # already recorded under a different Idempotency-Key
+            existing = await collection.find_one(
+                recorded_query(organization_id, transaction_token, idempotency_key), {"_id": 0}
+            )
+            if existing is None:
+                # Tokens are unique across organizations
+                raise DonationConflict("Transaction token was already used for another donation")
+        if existing:
+            return existing
+        if self.rollups is not None:
+            await self.rollups.add([donation])
+        return donation
+
+    async def insert_checkout_session(self, donation: Dict) -> None:
+        """Store a pending hosted-checkout donation; written directly so the donor can poll it"""
+        await self.get_collection().insert_one(dict(donation))
+
+    async def insert_many(self, donations: List[Dict]) -> Tuple[int, int]:
+        """Insert a batch directly (bulk imports); returns (inserted, duplicates skipped)"""
+        inserted, duplicates = donations, 0
+        try:
+            await self.get_collection().insert_many(donations, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if e.details.get("writeConcernErrors") or any(error.get("code") != DUPLICATE_KEY for error in errors):
+                raise
+            skipped = {error["index"] for error in errors}
+            inserted = [donation for index, donation in enumerate(donations) if index not in skipped]
+            duplicates = len(skipped)
+        if self.rollups is not None:
+            await self.rollups.add(inserted)
+        return len(inserted), duplicates
+
+    async def find_recorded(
+        self, organization_id: str, transaction_token: str, idempotency_key: Optional[str] = None
+    ) -> Optional[Dict]:
+        """The donation already recorded for this transaction, if any (one indexed lookup)"""
+        if self.writer is not None:
+            pending = self.writer.pending(f"{organization_id}:{transaction_token}")
+            if pending is not None:
+                return pending
+        return await self.get_collection().find_one(
+            recorded_query(organization_id, transaction_token, idempotency_key), {"_id": 0}
+        )
+
+    async def find_by_reference(self, reference: str) -> Optional[Dict]:
+        """A donation by its id or its checkout session id, as API clients see it"""
+        donation = self.writer.pending(reference) if self.writer is not None else None
+        if donation is None:
+            donation = await self.get_collection().find_one(
+                {"$or": [{"id": reference}, {"session_id": reference}]}, {"_id": 0}
+            )
+        return api_view(donation) if donation else None
+
+    async def list_for_organization(
+        self, organization_id: str, limit: int = 50, cursor: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """A page of the organization's donations, newest first, and the cursor for the next page.
+
+        Keyset pagination over (created_at, id): a page starts where the
+        previous one ended in the (organization_id, created_at, id) index, so
+        page 1000 costs the same as page 1. Raises ValueError for a bad cursor.
+        """
+        query: Dict = {"organization_id": organization_id}
+        if cursor is not None:
+            created_at, donation_id = decode_cursor(cursor)
+            after = [{"created_at": {"$lt": created_at}}, {"created_at": created_at, "id": {"$lt": donation_id}}]
+            if isinstance(created_at, datetime):
+                # Donations the type migration hasn't converted yet have string
+                # created_at values; they sort after every date, and a date
+                # comparison never matches them
+                after.append({"created_at": {"$type": "string"}})
+            query["$or"] = after
+        donations = await self.get_collection().find(query, {"_id": 0}).sort(
+            [("created_at", DESCENDING), ("id", DESCENDING)]
+        ).limit(limit + 1).to_list(limit + 1)
+        next_cursor = encode_cursor(donations[limit - 1]) if len(donations) > limit else None
+        return [api_view(donation) for donation in donations[:limit]], next_cursor
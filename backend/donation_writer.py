@@ -0,0 +1,378 @@
+"""Write-behind pipeline for donation records.
+
+submit() appends a record to a local journal, waits for the group fsync and
+returns; a background task moves journaled records into donations with
+insert_many. The journal is a directory of flock'd segment files, one JSON
+document per line, deleted once every record in it has reached Mongo. On
+startup a worker replays segments left by dead processes; replay is idempotent
+because duplicate-key errors are skipped. Records Mongo or the driver rejects
+for any other reason go to a dead-letter file in the journal directory.
+
+submit()'s lookup keys deduplicate retries within a worker and let pending()
+find records that haven't been flushed yet.
+"""
+import asyncio
+import fcntl
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from bson import json_util
+from pymongo.errors import BulkWriteError, ConnectionFailure, OperationFailure
+
+DUPLICATE_KEY = 11000
+# Canonical extended JSON round-trips datetimes, int64 and Decimal128 exactly
+JOURNAL_JSON_OPTIONS = json_util.CANONICAL_JSON_OPTIONS
+
+
+def already_inserted(error: Dict) -> bool:
+    """Whether a write error is a duplicate on the donation id (unique index id_unique)"""
+    if error.get("code") != DUPLICATE_KEY:
+        return False
+    key_pattern = error.get("keyPattern")
+    if key_pattern is not None:
+        return list(key_pattern) == ["id"]
+    # Older servers only name the index in the message
+    return "index: id_unique " in error.get("errmsg", "")
+
+
+class JournalSegment:
+    __slots__ = ("path", "file", "records", "pending")
+
+    def __init__(self, path: Path, file):
+        self.path = path
+        self.file = file
+        self.records = 0  # lines written or being written
+        self.pending = 0  # records not yet in Mongo
+
+
+class DonationWriteBehind:
+    def __init__(
+        self,
+        get_collection: Callable,
+        journal_dir: Path,
+        batch_size: int = 200,
+        flush_interval: float = 0.05,
+        segment_max_records: int = 5000,
+        retry_delay: float = 1.0,
+        on_inserted: Optional[Callable[[List[dict]], Awaitable]] = None,
+    ):
+        self.get_collection = get_collection
+        self.journal_dir = Path(journal_dir)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.segment_max_records = segment_max_records
+        self.retry_delay = retry_delay
+        # Called with the records each flush actually inserted (not duplicates)
+        self.on_inserted = on_inserted
+        self.queue: Deque[Tuple[JournalSegment, dict]] = deque()
+        # lookup key -> record, until the record is in Mongo
+        self._pending_keys: Dict[str, dict] = {}
+        self._keys_by_record: Dict[int, Tuple[str, ...]] = {}
+        self._active: Optional[JournalSegment] = None
+        self._segments: Dict[Path, JournalSegment] = {}
+        self._segment_seq = 0
+        self._new_segment_files = False
+        self._sync_batch: List[Tuple[JournalSegment, dict, bytes, asyncio.Future]] = []
+        self._sync_task: Optional[asyncio.Task] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._closed = False
+        # Metrics
+        self.journaled = 0
+        self.replayed = 0
+        self.flushed = 0
+        self.batches = 0
+        self.duplicates_skipped = 0
+        self.dead_lettered = 0
+        self.flush_failures = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._flush_ms_total = 0.0
+        self.last_fsync_ms = 0.0
+
+    async def start(self) -> None:
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        await asyncio.to_thread(self._replay)
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        """Stop accepting records and try to flush what's queued; the rest stays journaled"""
+        self._closed = True
+        if self._sync_task is not None:
+            await self._sync_task
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        while self.queue:
+            if not await self._flush_batch():
+                break
+        for segment in self._segments.values():
+            segment.file.close()
+
+    def pending(self, key: str) -> Optional[dict]:
+        """The queued record submitted under a lookup key, if not yet flushed"""
+        return self._pending_keys.get(key)
+
+    async def submit(self, record: dict, keys: Tuple[str, ...] = ()) -> dict:
+        """Durably journal a donation record and return it (or the record already queued under one of keys)"""
+        if self._closed:
+            raise RuntimeError("Donation writer is shut down")
+        for key in keys:
+            if key in self._pending_keys:
+                return self._pending_keys[key]
+        self._register_keys(record, keys)
+        segment = self._segment_for_write()
+        segment.records += 1
+        segment.pending += 1
+        line = json_util.dumps(record, json_options=JOURNAL_JSON_OPTIONS).encode() + b"\n"
+        future = asyncio.get_running_loop().create_future()
+        self._sync_batch.append((segment, record, line, future))
+        if self._sync_task is None:
+            self._sync_task = asyncio.create_task(self._sync())
+        # Once journaled the record is queued even if this request goes away
+        try:
+            await asyncio.shield(future)
+        except Exception:
+            self._forget_keys(record)
+            raise
+        return record
+
+    def _register_keys(self, record: dict, keys: Tuple[str, ...]) -> None:
+        if keys:
+            self._keys_by_record[id(record)] = keys
+            for key in keys:
+                self._pending_keys[key] = record
+
+    def _forget_keys(self, record: dict) -> None:
+        for key in self._keys_by_record.pop(id(record), ()):
+            self._pending_keys.pop(key, None)
+
+    def stats(self) -> Dict:
+        return {
+            "queue_depth": len(self.queue),
+            "journal_segments": len(self._segments),
+            "journaled": self.journaled,
+            "replayed": self.replayed,
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "duplicates_skipped": self.duplicates_skipped,
+            "dead_lettered": self.dead_lettered,
+            "flush_failures": self.flush_failures,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "avg_flush_ms": round(self._flush_ms_total / self.batches, 2) if self.batches else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 2),
+            "last_fsync_ms": round(self.last_fsync_ms, 2),
+        }
+
+    # Journal
+
+    def _segment_for_write(self) -> JournalSegment:
+        if self._active is None or self._active.records >= self.segment_max_records:
+            previous = self._active
+            self._segment_seq += 1
+            path = self.journal_dir / f"donations-{os.getpid()}-{int(time.time())}-{self._segment_seq}.jsonl"
+            self._active = self._open_segment(path)
+            if previous is not None:
+                self._retire_if_done(previous)
+        return self._active
+
+    def _open_segment(self, path: Path) -> JournalSegment:
+        file = open(path, "ab")
+        # Held for the segment's lifetime so no other worker replays it
+        try:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            file.close()
+            raise
+        segment = JournalSegment(path, file)
+        self._segments[path] = segment
+        self._new_segment_files = True
+        return segment
+
+    async def _sync(self) -> None:
+        while self._sync_batch:
+            batch, self._sync_batch = self._sync_batch, []
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(self._write_lines, batch)
+            except Exception as e:
+                logging.error(f"Donation journal write failed: {e}")
+                for segment, _, _, future in batch:
+                    segment.pending -= 1
+                    self._retire_if_done(segment)
+                    future.set_exception(e)
+                continue
+            self.last_fsync_ms = (time.perf_counter() - started) * 1000
+            for segment, record, _, future in batch:
+                self.journaled += 1
+                self.queue.append((segment, record))
+                future.set_result(None)
+            self._wakeup.set()
+        self._sync_task = None
+
+    def _write_lines(self, batch: List[Tuple[JournalSegment, dict, bytes, asyncio.Future]]) -> None:
+        segments = {}
+        for segment, _, line, _ in batch:
+            segment.file.write(line)
+            segments[id(segment)] = segment
+        for segment in segments.values():
+            segment.file.flush()
+            os.fsync(segment.file.fileno())
+        if self._new_segment_files:
+            # Make the new segment files' directory entries durable too
+            self._new_segment_files = False
+            dir_fd = os.open(self.journal_dir, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    def _retire_if_done(self, segment: JournalSegment) -> None:
+        if segment.pending > 0:
+            return
+        if segment is self._active:
+            self._active = None
+        self._segments.pop(segment.path, None)
+        segment.file.close()
+        segment.path.unlink(missing_ok=True)
+
+    def _replay(self) -> None:
+        for path in sorted(self.journal_dir.glob("donations-*.jsonl")):
+            try:
+                segment = self._open_segment(path)
+            except BlockingIOError:
+                continue  # a live worker's segment
+            records = []
+            with open(path, "rb") as journal:
+                for line_number, line in enumerate(journal, 1):
+                    if not line.endswith(b"\n"):
+                        # Torn write from a crash; it was never acknowledged
+                        logging.warning(f"Skipping incomplete record at {path.name}:{line_number}")
+                        continue
+                    try:
+                        records.append(json_util.loads(line, json_options=JOURNAL_JSON_OPTIONS))
+                    except ValueError as e:
+                        logging.error(f"Skipping unreadable record at {path.name}:{line_number}: {e}")
+            segment.records = segment.pending = len(records)
+            for record in records:
+                self.queue.append((segment, record))
+            self.replayed += len(records)
+            if records:
+                logging.info(f"Replaying {len(records)} journaled donations from {path.name}")
+            else:
+                self._retire_if_done(segment)
+
+    # Flushing
+
+    async def _flush_loop(self) -> None:
+        while True:
+            if not self.queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            if len(self.queue) < self.batch_size:
+                # Give a batch a moment to fill up
+                await asyncio.sleep(self.flush_interval)
+            if not await self._flush_batch():
+                await asyncio.sleep(self.retry_delay)
+
+    async def _flush_batch(self) -> bool:
+        batch = [self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+        if not batch:
+            return True
+        started = time.perf_counter()
+        try:
+            inserted, rejected = await self._insert_batch([record for _, record in batch])
+            if rejected:
+                await asyncio.to_thread(self._dead_letter, rejected)
+        except Exception as e:
+            logging.error(f"Flushing {len(batch)} donations failed, will retry: {e}")
+            self.flush_failures += 1
+            self.queue.extendleft(reversed(batch))
+            return False
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.batches += 1
+        self.flushed += len(batch)
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self._flush_ms_total += elapsed_ms
+        for _, record in batch:
+            self._forget_keys(record)
+        for segment, _ in batch:
+            segment.pending -= 1
+        # Segments (including the active one) whose records are all in Mongo go away
+        for segment in {id(segment): segment for segment, _ in batch}.values():
+            self._retire_if_done(segment)
+        if self.on_inserted is not None and inserted:
+            await self.on_inserted(inserted)
+        return True
+
+    async def _insert_batch(self, records: List[dict]) -> Tuple[List[dict], List[Tuple[dict, dict]]]:
+        """_insert(), with records the driver refuses to send rejected one by one"""
+        try:
+            return await self._insert(records)
+        except (ConnectionFailure, OperationFailure):
+            # Network and server errors: the whole batch is retried
+            raise
+        except Exception as e:
+            # Raised by the driver itself (e.g. a value BSON can't encode),
+            # so it fails the same way on every retry
+            if len(records) == 1:
+                return [], [(records[0], {"errmsg": f"{type(e).__name__}: {e}"})]
+        inserted: List[dict] = []
+        rejected: List[Tuple[dict, dict]] = []
+        for record in records:
+            record_inserted, record_rejected = await self._insert_batch([record])
+            inserted += record_inserted
+            rejected += record_rejected
+        return inserted, rejected
+
+    async def _insert(self, records: List[dict]) -> Tuple[List[dict], List[Tuple[dict, dict]]]:
+        """Insert records, skipping ones already in Mongo.
+
+        Returns the records inserted and (record, write error) for the ones
+        Mongo rejected, which retrying won't fix.
+        """
+        try:
+            await self.get_collection().insert_many(records, ordered=False)
+        except BulkWriteError as e:
+            if e.details.get("writeConcernErrors"):
+                raise
+            errors = {error["index"]: error for error in e.details.get("writeErrors", [])}
+            # Records whose id is taken were already inserted before a crash or
+            # a failed attempt. A duplicate transaction token or Idempotency-Key
+            # is a different donation, and is rejected.
+            duplicates = [index for index, error in errors.items() if already_inserted(error)]
+            self.duplicates_skipped += len(duplicates)
+            inserted = [record for index, record in enumerate(records) if index not in errors]
+            rejected = [(records[index], error) for index, error in errors.items() if index not in duplicates]
+            return inserted, rejected
+        return records, []
+
+    def _dead_letter(self, rejected: List[Tuple[dict, dict]]) -> None:
+        """Append rejected records to this process's dead-letter file, so they don't block the queue"""
+        path = self.journal_dir / f"dead-letter-{os.getpid()}.jsonl"
+        with open(path, "ab") as file:
+            for record, error in rejected:
+                entry = {
+                    "record": record,
+                    "code": error.get("code"),
+                    "error": error.get("errmsg"),
+                    "failed_at": datetime.utcnow(),
+                }
+                file.write(json_util.dumps(entry, json_options=JOURNAL_JSON_OPTIONS).encode() + b"\n")
+            file.flush()
+            os.fsync(file.fileno())
+        for record, error in rejected:
+            logging.error(
+                f"Donation {record.get('id')} rejected by Mongo ({error.get('code')}: {error.get('errmsg')}), "
+                f"moved to {path.name}"
+            )
+        self.dead_lettered += len(rejected)
@@ -0,0 +1,21 @@
+"""Render every configured organization's embed page into EMBED_EXPORT_DIR.
+
+nginx serves the exported files directly (see nginx.conf); the backend keeps
+them fresh on every organization write, so this is only needed to rebuild the
+directory from scratch, e.g. after changing templates or wiping the volume.
+
+    EMBED_EXPORT_DIR=/var/cache/donation-embeds python export_embeds.py
+"""
+import asyncio
+
+import server
+
+
+async def main():
+    exported = await server.export_all_embed_pages()
+    print(f"Exported {exported} embed pages to {server.EMBED_EXPORT_DIR}")
+    server.client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,145 @@
+"""Indexes the server's queries rely on.
+
+ensure_indexes() runs at startup (see server.py). It creates any index in
+REQUIRED_INDEXES that is missing and reports indexes that exist with the same
+keys but different options, or that can't be built, e.g. a unique index over
+data that already has duplicates. INDEX_MODE=check only reports, and startup
+fails if anything is missing or conflicting. The check can also be run by hand:
+
+    python indexes.py           # create what's missing
+    python indexes.py --check   # exit non-zero if anything is missing
+"""
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+# Index options that change what an index means; two indexes on the same keys
+# that differ in any of these conflict
+COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression")
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    name: str
+    keys: Tuple[Tuple[str, int], ...]
+    options: Dict = field(default_factory=dict, hash=False)
+
+
+REQUIRED_INDEXES: Dict[str, List[IndexSpec]] = {
+    "organizations": [
+        IndexSpec("id_unique", (("id", ASCENDING),), {"unique": True}),
+        # Also serves login, which matches admin_email + admin_password_hash
+        IndexSpec("admin_email_unique", (("admin_email", ASCENDING),), {"unique": True}),
+    ],
+    "donations": [
+        # Makes replaying the donation journal idempotent (donation_writer.py)
+        IndexSpec("id_unique", (("id", ASCENDING),), {"unique": True}),
+        # One donation per Blackbaud transaction, and per client Idempotency-Key
+        IndexSpec(
+            "transaction_token_unique", (("transaction_token", ASCENDING),),
+            {"unique": True, "partialFilterExpression": {"transaction_token": {"$type": "string"}}}
+        ),
+        IndexSpec(
+            "organization_idempotency_key_unique", (("organization_id", ASCENDING), ("idempotency_key", ASCENDING)),
+            {"unique": True, "partialFilterExpression": {"idempotency_key": {"$type": "string"}}}
+        ),
+        # The org's donation list, paged by (created_at, id); also serves stats
+        # and rollup rebuilds, which match on organization_id. It supersedes
+        # organization_created_at, which can be dropped once this is built.
+        IndexSpec(
+            "organization_created_at_id",
+            (("organization_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING))
+        ),
+        # The verification queue (verification_worker.py); only pending
+        # donations are indexed, so it stays as small as the backlog
+        IndexSpec(
+            "verification_queue", (("status", ASCENDING), ("verification.next_attempt_at", ASCENDING)),
+            {"partialFilterExpression": {"status": "pending_verification"}}
+        ),
+        # Status polling for hosted checkout sessions (donation_store.py)
+        IndexSpec(
+            "session_id_unique", (("session_id", ASCENDING),),
+            {"unique": True, "partialFilterExpression": {"session_id": {"$type": "string"}}}
+        ),
+    ],
+    "donation_daily_rollups": [
+        # One document per organization and day, upserted by donation_rollups.py
+        IndexSpec("organization_day_unique", (("organization_id", ASCENDING), ("day", ASCENDING)), {"unique": True}),
+    ],
+}
+
+
+@dataclass
+class IndexReport:
+    created: List[str] = field(default_factory=list)
+    missing: List[str] = field(default_factory=list)
+    conflicts: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.missing and not self.conflicts
+
+
+def _key(key: Dict) -> Tuple[Tuple[str, int], ...]:
+    # The server may report directions as doubles (1.0, -1.0)
+    return tuple(
+        (name, int(direction) if isinstance(direction, float) else direction)
+        for name, direction in key.items()
+    )
+
+
+def _options(index: Dict) -> Dict:
+    return {option: index[option] for option in COMPARED_OPTIONS if index.get(option)}
+
+
+async def ensure_indexes(db, create: bool = True) -> IndexReport:
+    """Create missing indexes (unless create is False) and report problems"""
+    report = IndexReport()
+    for collection_name, specs in REQUIRED_INDEXES.items():
+        collection = db[collection_name]
+        existing = {_key(index["key"]): index async for index in collection.list_indexes()}
+        for spec in specs:
+            label = f"{collection_name}.{spec.name}"
+            index = existing.get(spec.keys)
+            if index is not None:
+                if _options(index) != _options(spec.options):
+                    report.conflicts.append(
+                        f"{label}: index {index['name']} has options {_options(index)}, expected {_options(spec.options)}"
+                    )
+                continue
+            if not create:
+                report.missing.append(label)
+                continue
+            try:
+                await collection.create_index(list(spec.keys), name=spec.name, **spec.options)
+                report.created.append(label)
+            except OperationFailure as e:
+                # Duplicate data under a unique index, or the name is taken by other keys
+                report.conflicts.append(f"{label}: {e}")
+
+    for label in report.created:
+        logging.info(f"Created index {label}")
+    for label in report.missing:
+        logging.error(f"Missing index {label}")
+    for conflict in report.conflicts:
+        logging.error(f"Conflicting index {conflict}")
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    import sys
+
+    import server
+
+    parser = argparse.ArgumentParser(description="Create or check the indexes the server needs")
+    parser.add_argument("--check", action="store_true", help="report missing indexes without creating them")
+    args = parser.parse_args()
+
+    report = asyncio.run(ensure_indexes(server.db, create=not args.check))
+    print(f"created: {len(report.created)}, missing: {len(report.missing)}, conflicts: {len(report.conflicts)}")
+    sys.exit(0 if report.ok else 1)
@@ -0,0 +1,146 @@
+"""Convert donations written before donation_fields.py to native types.
+
+Old donations have "amount" as a float (or numeric string) in dollars and
+created_at as an isoformat() string. This rewrites them with amount_cents and
+a BSON datetime created_at, while the server keeps running:
+
+- Documents are visited in _id order, batch_size at a time. Each batch is a
+  fresh _id-range query, so no cursor or lock is held between batches, and
+  --pause leaves room for the dashboard's queries on a busy cluster.
+- Each batch is written with one unordered bulk_write.
+- The last _id converted is checkpointed in the migrations collection after
+  every batch. A run that is interrupted resumes from there; --restart (or a
+  run after a completed one) starts over, which only costs a scan since
+  converted documents no longer match.
+- Documents whose values can't be parsed are left alone and reported.
+
+    python migrate_donation_types.py [--batch-size 500] [--pause 0.1] [--restart]
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from donation_fields import parse_created_at, to_minor_units
+
+MIGRATION_ID = "donation_native_types"
+
+# Donations still in the old format
+LEGACY_FILTER = {"$or": [{"created_at": {"$type": "string"}}, {"amount": {"$exists": True}}]}
+
+
+@dataclass
+class MigrationReport:
+    total: int = 0  # legacy documents when the run started
+    converted: int = 0
+    failed: List[str] = field(default_factory=list)
+    batches: int = 0
+    elapsed_seconds: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.converted / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+
+def convert(donation: Dict) -> Dict:
+    """The update for one legacy donation; raises ValueError if it can't be converted"""
+    update: Dict = {}
+    if isinstance(donation.get("created_at"), str):
+        update.setdefault("$set", {})["created_at"] = parse_created_at(donation["created_at"])
+    if "amount" in donation:
+        if "amount_cents" not in donation:
+            update.setdefault("$set", {})["amount_cents"] = to_minor_units(donation["amount"])
+        update["$unset"] = {"amount": ""}
+    return update
+
+
+async def migrate_donation_types(
+    db,
+    batch_size: int = 500,
+    pause: float = 0.0,
+    restart: bool = False,
+    progress: Optional[Callable[[MigrationReport], None]] = None,
+) -> MigrationReport:
+    donations = db["donations"]
+    checkpoints = db["migrations"]
+    report = MigrationReport()
+
+    checkpoint = None if restart else await checkpoints.find_one({"_id": MIGRATION_ID})
+    last_id = checkpoint.get("last_id") if checkpoint else None
+    if last_id is not None:
+        logging.info(f"Resuming donation type migration after _id {last_id}")
+
+    def batch_filter() -> Dict:
+        return {**LEGACY_FILTER, "_id": {"$gt": last_id}} if last_id is not None else dict(LEGACY_FILTER)
+
+    report.total = await donations.count_documents(batch_filter())
+    started = time.perf_counter()
+    projection = {"_id": 1, "amount": 1, "amount_cents": 1, "created_at": 1}
+    while True:
+        batch = await donations.find(batch_filter(), projection).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        operations = []
+        for donation in batch:
+            try:
+                operations.append(UpdateOne({"_id": donation["_id"]}, convert(donation)))
+            except ValueError as e:
+                report.failed.append(f"{donation['_id']}: {e}")
+        converted = 0
+        if operations:
+            result = await donations.bulk_write(operations, ordered=False)
+            converted = result.modified_count
+        report.converted += converted
+        last_id = batch[-1]["_id"]
+        report.batches += 1
+        report.elapsed_seconds = time.perf_counter() - started
+        await checkpoints.update_one(
+            {"_id": MIGRATION_ID},
+            {"$set": {"last_id": last_id, "updated_at": datetime.utcnow()}, "$inc": {"converted": converted}},
+            upsert=True,
+        )
+        if progress:
+            progress(report)
+        if pause:
+            await asyncio.sleep(pause)
+
+    report.elapsed_seconds = time.perf_counter() - started
+    await checkpoints.update_one(
+        {"_id": MIGRATION_ID},
+        # The next run scans from the start, for anything an old server wrote since
+        {"$set": {"completed_at": datetime.utcnow(), "failed": report.failed[:1000]}, "$unset": {"last_id": ""}},
+        upsert=True,
+    )
+    for failure in report.failed:
+        logging.error(f"Could not convert donation {failure}")
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import server
+
+    parser = argparse.ArgumentParser(description="Convert legacy donation amounts and timestamps to native types")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between batches")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and scan from the start")
+    args = parser.parse_args()
+
+    def print_progress(report: MigrationReport) -> None:
+        done = report.converted + len(report.failed)
+        remaining = max(report.total - done, 0)
+        eta = remaining / report.rate if report.rate else 0.0
+        print(f"{done}/{report.total} donations, {report.rate:.0f}/s, ~{eta:.0f}s left", flush=True)
+
+    report = asyncio.run(migrate_donation_types(
+        server.db, batch_size=args.batch_size, pause=args.pause, restart=args.restart, progress=print_progress
+    ))
+    print(
+        f"converted: {report.converted}, failed: {len(report.failed)}, "
+        f"batches: {report.batches}, {report.elapsed_seconds:.1f}s"
+    )
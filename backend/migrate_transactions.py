@@ -0,0 +1,129 @@
+"""Copy checkout sessions from the old transactions collection into donations.
+
+Documents are converted to the donation_store.py schema and upserted on the
+donation id in _id-ordered batches, checkpointed in the migrations collection,
+so reruns are harmless and an interrupted run resumes. Run it before and after
+deploying the server that stops writing transactions.
+
+    python migrate_transactions.py [--batch-size 500] [--pause 0.1] [--restart]
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from pymongo import UpdateOne
+
+from donation_fields import parse_created_at, to_minor_units
+from donation_store import CHECKOUT_SESSION
+from migrate_donation_types import MigrationReport
+
+MIGRATION_ID = "merge_transactions"
+
+
+def to_donation(transaction: Dict) -> Dict:
+    """A transactions document in the donations schema; raises ValueError if it can't be converted"""
+    donation = {
+        "id": transaction["id"],
+        "organization_id": transaction["org_id"],
+        "amount_cents": to_minor_units(transaction.get("amount")),
+        "donor_email": transaction.get("donor_email"),
+        "donor_name": transaction.get("donor_name"),
+        "status": transaction.get("status", "pending"),
+        "payment_method": CHECKOUT_SESSION,
+        "created_at": parse_created_at(transaction["created_at"]),
+        "session_id": transaction.get("session_id"),
+        "transaction_id": transaction.get("bb_transaction_id"),
+        "completed_at": transaction.get("completed_at"),
+        "metadata": transaction.get("metadata") or {},
+    }
+    return {name: value for name, value in donation.items() if value is not None}
+
+
+async def migrate_transactions(
+    db,
+    batch_size: int = 500,
+    pause: float = 0.0,
+    restart: bool = False,
+    progress: Optional[Callable[[MigrationReport], None]] = None,
+) -> MigrationReport:
+    transactions = db["transactions"]
+    donations = db["donations"]
+    checkpoints = db["migrations"]
+    report = MigrationReport()
+
+    checkpoint = None if restart else await checkpoints.find_one({"_id": MIGRATION_ID})
+    last_id = checkpoint.get("last_id") if checkpoint else None
+    if last_id is not None:
+        logging.info(f"Resuming transactions merge after _id {last_id}")
+
+    def batch_filter() -> Dict:
+        return {"_id": {"$gt": last_id}} if last_id is not None else {}
+
+    report.total = await transactions.count_documents(batch_filter())
+    started = time.perf_counter()
+    while True:
+        batch = await transactions.find(batch_filter()).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        operations = []
+        for transaction in batch:
+            try:
+                donation = to_donation(transaction)
+            except (KeyError, ValueError) as e:
+                report.failed.append(f"{transaction['_id']}: {e!r}")
+                continue
+            # Copied already, or written by the new server: leave it alone
+            operations.append(UpdateOne({"id": donation["id"]}, {"$setOnInsert": donation}, upsert=True))
+        converted = 0
+        if operations:
+            result = await donations.bulk_write(operations, ordered=False)
+            converted = result.upserted_count
+        report.converted += converted
+        last_id = batch[-1]["_id"]
+        report.batches += 1
+        report.elapsed_seconds = time.perf_counter() - started
+        await checkpoints.update_one(
+            {"_id": MIGRATION_ID},
+            {"$set": {"last_id": last_id, "updated_at": datetime.utcnow()}, "$inc": {"converted": converted}},
+            upsert=True,
+        )
+        if progress:
+            progress(report)
+        if pause:
+            await asyncio.sleep(pause)
+
+    report.elapsed_seconds = time.perf_counter() - started
+    await checkpoints.update_one(
+        {"_id": MIGRATION_ID},
+        {"$set": {"completed_at": datetime.utcnow(), "failed": report.failed[:1000]}},
+        upsert=True,
+    )
+    for failure in report.failed:
+        logging.error(f"Could not merge transaction {failure}")
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import server
+
+    parser = argparse.ArgumentParser(description="Copy checkout sessions from transactions into donations")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between batches")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and copy from the start")
+    args = parser.parse_args()
+
+    def print_progress(report: MigrationReport) -> None:
+        done = report.converted + len(report.failed)
+        print(f"{done}/{report.total} transactions, {report.rate:.0f}/s", flush=True)
+
+    report = asyncio.run(migrate_transactions(
+        server.db, batch_size=args.batch_size, pause=args.pause, restart=args.restart, progress=print_progress
+    ))
+    print(
+        f"merged: {report.converted}, failed: {len(report.failed)}, "
+        f"batches: {report.batches}, {report.elapsed_seconds:.1f}s"
+    )
@@ -0,0 +1,149 @@
+"""In-process cache of organization documents.
+
+Nearly every public request (embed pages, form config, donate and transaction
+endpoints) starts by loading the same few organizations. OrgCache keeps them in
+memory (server.py's loader returns OrgSnapshots) with a TTL and LRU eviction;
+server.py invalidates an entry whenever it writes to that organization.
+
+Entries are keyed by (org_id, view), where the view names the projection the
+loader used (see org_views.py), so each use case caches only the fields it
+reads. Invalidating an organization drops all of its views.
+
+Misses are single-flight: concurrent lookups of the same (org_id, view), such
+as a burst of donors opening one organization's embed after a campaign email,
+share one in-flight query instead of each issuing their own.
+
+Lookups that find nothing are remembered too, for a shorter TTL and in their
+own bounded table, so stale iframe URLs and crawlers probing unknown ids don't
+reach Mongo on every request and can't evict real organizations.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class OrgCache:
+    """Bounded TTL + LRU cache in front of an async loader.
+
+    Cached values are shared between requests and must be treated as
+    read-only by callers.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str, str], Awaitable[Optional[Any]]],
+        max_entries: int = 1000,
+        ttl_seconds: float = 60.0,
+        negative_max_entries: int = 10000,
+        negative_ttl_seconds: float = 30.0,
+    ):
+        self.loader = loader
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.negative_max_entries = negative_max_entries
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], tuple]" = OrderedDict()
+        # key -> expires_at for lookups that found no organization
+        self._missing: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+        # Bumped on every invalidation so a load that raced with a write
+        # doesn't put the pre-write document back into the cache
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.coalesced = 0
+        self.negative_hits = 0
+
+    async def get(self, org_id: str, view: str = "full") -> Optional[Any]:
+        key = (org_id, view)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, doc = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return doc
+            del self._entries[key]
+
+        missing_until = self._missing.get(key)
+        if missing_until is not None:
+            if missing_until > time.monotonic():
+                self.negative_hits += 1
+                return None
+            del self._missing[key]
+
+        load = self._inflight.get(key)
+        if load is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            load = asyncio.ensure_future(self._load(key))
+            self._inflight[key] = load
+        # Shielded so one caller going away doesn't cancel the others' query
+        return await asyncio.shield(load)
+
+    async def _load(self, key: Tuple[str, str]) -> Optional[Any]:
+        epoch = self._epoch
+        try:
+            doc = await self.loader(*key)
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+        if epoch == self._epoch:
+            if doc is not None:
+                self._store(key, doc)
+            else:
+                self._store_missing(key)
+        return doc
+
+    def _store(self, key: Tuple[str, str], doc: Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, doc)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _store_missing(self, key: Tuple[str, str]) -> None:
+        # Never outlive positive entries, e.g. while ttl_seconds is lowered
+        ttl = min(self.negative_ttl_seconds, self.ttl_seconds)
+        self._missing[key] = time.monotonic() + ttl
+        self._missing.move_to_end(key)
+        while len(self._missing) > self.negative_max_entries:
+            self._missing.popitem(last=False)
+
+    def invalidate(self, org_id: str) -> None:
+        self._epoch += 1
+        self.invalidations += 1
+        for key in [key for key in self._entries if key[0] == org_id]:
+            del self._entries[key]
+        for key in [key for key in self._missing if key[0] == org_id]:
+            del self._missing[key]
+        # Lookups from here on must not join a query that may predate the write
+        for key in [key for key in self._inflight if key[0] == org_id]:
+            del self._inflight[key]
+
+    def clear(self) -> None:
+        self._epoch += 1
+        self._entries.clear()
+        self._missing.clear()
+        self._inflight.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+            "negative_size": len(self._missing),
+            "negative_hits": self.negative_hits,
+        }
@@ -0,0 +1,187 @@
+"""Cross-process invalidation of cached organizations via MongoDB change streams.
+
+Each uvicorn worker keeps its own OrgCache and rendered embed pages, so a form
+settings change or test-mode toggle handled by one worker is invisible to the
+others until their TTL runs out. OrgChangeWatcher tails the organizations
+collection and invalidates the local caches for every changed organization.
+
+Change streams need a replica set. Against a standalone mongod the watcher
+switches the org cache to a short fallback TTL and retries periodically; once
+a stream is established the normal TTL is restored.
+
+To try it locally, start a single-node replica set and point MONGO_URL at it:
+
+    mongod --replSet rs0 --dbpath /tmp/rs0 --port 27017 &
+    mongosh --eval 'rs.initiate()'
+    MONGO_URL="mongodb://127.0.0.1:27017/?replicaSet=rs0" python org_change_stream.py
+
+then change an organization (e.g. toggle test mode in the dashboard) and watch
+the invalidations being logged.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from org_cache import OrgCache
+
+# Server error codes meaning "this deployment can't run change streams"
+CHANGE_STREAMS_UNSUPPORTED = {
+    40573,  # The $changeStream stage is only supported on replica sets
+    40324,  # Unrecognized pipeline stage name: '$changeStream'
+}
+# The resume token fell off the oplog (or is otherwise unusable); events were lost
+RESUME_TOKEN_LOST = {
+    260,  # InvalidResumeToken
+    280,  # ChangeStreamFatalError
+    286,  # ChangeStreamHistoryLost
+}
+
+# Only the org id is needed to invalidate, so keep the events small
+WATCH_PIPELINE = [
+    {"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}},
+    {"$project": {"operationType": 1, "documentKey": 1, "fullDocument.id": 1}},
+]
+
+
+class OrgChangeWatcher:
+    def __init__(
+        self,
+        get_collection: Callable,
+        invalidate: Callable[[str], Awaitable[None]],
+        reset: Callable[[], None],
+        org_cache: OrgCache,
+        fallback_ttl_seconds: float = 5.0,
+        unsupported_retry_seconds: float = 60.0,
+        max_backoff_seconds: float = 30.0,
+    ):
+        self.get_collection = get_collection
+        self.invalidate = invalidate
+        self.reset = reset
+        self.org_cache = org_cache
+        self.normal_ttl_seconds = org_cache.ttl_seconds
+        self.fallback_ttl_seconds = fallback_ttl_seconds
+        self.unsupported_retry_seconds = unsupported_retry_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.resume_token = None
+        self.connected = False
+        self.events_seen = 0
+        self._backoff = 1.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self) -> dict:
+        return {
+            "connected": self.connected,
+            "events_seen": self.events_seen,
+            "cache_ttl_seconds": self.org_cache.ttl_seconds,
+        }
+
+    def _use_fallback_ttl(self) -> None:
+        self.connected = False
+        self.org_cache.ttl_seconds = min(self.normal_ttl_seconds, self.fallback_ttl_seconds)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._watch()
+            except asyncio.CancelledError:
+                raise
+            except (OperationFailure, NotImplementedError) as e:
+                code = getattr(e, "code", None)
+                if isinstance(e, NotImplementedError) or code in CHANGE_STREAMS_UNSUPPORTED:
+                    logging.warning(
+                        f"Change streams unavailable ({e}); org cache TTL lowered to "
+                        f"{self.fallback_ttl_seconds}s"
+                    )
+                    self._use_fallback_ttl()
+                    await asyncio.sleep(self.unsupported_retry_seconds)
+                    continue
+                if code in RESUME_TOKEN_LOST:
+                    # We can't know what changed while we were away
+                    logging.warning(f"Change stream history lost ({e}); clearing org cache")
+                    self.resume_token = None
+                    self.reset()
+                else:
+                    logging.error(f"Organization change stream failed: {e}")
+                self._use_fallback_ttl()
+            except PyMongoError as e:
+                logging.error(f"Organization change stream disconnected: {e}")
+                self._use_fallback_ttl()
+            except Exception as e:
+                logging.error(f"Unexpected error in organization change stream: {e}")
+                self._use_fallback_ttl()
+            await asyncio.sleep(self._backoff)
+            self._backoff = min(self._backoff * 2, self.max_backoff_seconds)
+
+    async def _watch(self) -> None:
+        collection = self.get_collection()
+        async with collection.watch(
+            WATCH_PIPELINE,
+            full_document="updateLookup",
+            resume_after=self.resume_token,
+        ) as stream:
+            if self.resume_token is None:
+                # Anything cached before the stream opened may already be stale
+                self.reset()
+            self.connected = True
+            self._backoff = 1.0
+            self.org_cache.ttl_seconds = self.normal_ttl_seconds
+            logging.info("Watching organizations change stream")
+            async for change in stream:
+                self.events_seen += 1
+                await self._handle(change)
+                self.resume_token = stream.resume_token
+
+    async def _handle(self, change: dict) -> None:
+        org_id = (change.get("fullDocument") or {}).get("id")
+        if org_id:
+            await self.invalidate(org_id)
+        else:
+            # Deletes (and updates whose document is already gone) only carry
+            # the Mongo _id; they're rare enough to just drop everything
+            self.reset()
+
+
+if __name__ == "__main__":
+    import os
+    from pathlib import Path
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / ".env")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+        db = client[os.environ.get("DB_NAME", "donation_builder")]
+
+        async def log_invalidation(org_id: str) -> None:
+            logging.info(f"Invalidate organization {org_id}")
+
+        def log_reset() -> None:
+            logging.info("Reset all cached organizations")
+
+        async def no_loader(org_id: str, view: str) -> None:
+            return None
+
+        cache = OrgCache(no_loader)
+        watcher = OrgChangeWatcher(lambda: db["organizations"], log_invalidation, log_reset, cache)
+        watcher.start()
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+"""Immutable, pre-resolved view of an organization for request handlers.
+
+Organization documents have accumulated legacy layouts: the access token may
+live in bb_access_token or bbms_config.access_token, and the merchant for each
+mode falls back to bb_merchant_id. OrgSnapshot resolves those fallbacks once,
+when the document is loaded into OrgCache, so handlers read plain attributes
+instead of probing dicts and rebuilding the Organization model per request.
+"""
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+DEFAULT_PRESET_AMOUNTS = (25, 50, 100)
+
+
+class OrgSnapshot:
+    __slots__ = (
+        "id",
+        "name",
+        "test_mode",
+        "updated_at",
+        "form_settings",
+        "preset_amounts",
+        "encrypted_access_token",
+        "has_bbms_access",
+        "legacy_merchant_id",
+        "test_merchant_id",
+        "production_merchant_id",
+        "merchant_id",
+    )
+
+    id: str
+    name: Optional[str]
+    test_mode: bool
+    updated_at: Optional[datetime]
+    form_settings: Dict  # shared with every reader; never mutate
+    preset_amounts: Tuple
+    encrypted_access_token: Optional[str]
+    has_bbms_access: bool
+    legacy_merchant_id: Optional[str]
+    test_merchant_id: Optional[str]
+    production_merchant_id: Optional[str]
+    merchant_id: Optional[str]  # for the current mode, with the legacy fallback
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            object.__setattr__(self, name, fields[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError("OrgSnapshot is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("OrgSnapshot is immutable")
+
+    def __repr__(self) -> str:
+        return f"OrgSnapshot(id={self.id!r}, test_mode={self.test_mode!r})"
+
+    @classmethod
+    def from_document(cls, doc: Dict) -> "OrgSnapshot":
+        """Build from a full or projected organization document"""
+        test_mode = doc.get("test_mode", True)
+        form_settings = doc.get("form_settings") or {}
+        encrypted_access_token = (
+            doc.get("bb_access_token")
+            or (doc.get("bbms_config") or {}).get("access_token")
+            or None
+        )
+        legacy_merchant_id = doc.get("bb_merchant_id")
+        test_merchant_id = doc.get("bb_test_merchant_id")
+        production_merchant_id = doc.get("bb_production_merchant_id")
+        if test_mode:
+            merchant_id = test_merchant_id or legacy_merchant_id
+        else:
+            merchant_id = production_merchant_id or legacy_merchant_id
+        return cls(
+            id=doc["id"],
+            name=doc.get("name"),
+            test_mode=test_mode,
+            updated_at=doc.get("updated_at"),
+            form_settings=form_settings,
+            preset_amounts=tuple(sorted(form_settings.get("preset_amounts", DEFAULT_PRESET_AMOUNTS))),
+            encrypted_access_token=encrypted_access_token,
+            # The embed view projects only this flag, never the token
+            has_bbms_access=doc.get("has_bbms_access", encrypted_access_token is not None),
+            legacy_merchant_id=legacy_merchant_id,
+            test_merchant_id=test_merchant_id,
+            production_merchant_id=production_merchant_id,
+            merchant_id=merchant_id,
+        )
@@ -0,0 +1,40 @@
+"""Per-use-case projections of the organizations collection.
+
+An organization document carries the admin password hash, reset codes,
+encrypted Blackbaud tokens and OAuth scratch fields alongside the handful of
+fields a public request actually reads. Each view below is the projection for
+one use case; server.py loads views through load_checkout_view(),
+load_embed_view() and load_form_view() so public paths never decode (or cache)
+more than they need. Whatever the view, the cached result is an OrgSnapshot
+(org_snapshot.py), with fields outside the projection left empty.
+"""
+from typing import Dict, List, Optional
+
+FORM_VIEW_FIELDS: List[str] = ["id", "name", "test_mode", "updated_at", "form_settings"]
+
+ORG_VIEW_PROJECTIONS: Dict[str, Optional[Dict]] = {
+    # Whole document, for authenticated admin endpoints
+    "full": None,
+    "form": {"_id": 0, **{field: 1 for field in FORM_VIEW_FIELDS}},
+    "embed": {
+        "_id": 0,
+        **{field: 1 for field in FORM_VIEW_FIELDS},
+        # Only whether a token is configured, never the token itself. Missing
+        # and null sort below strings, so this matches any non-empty token.
+        "has_bbms_access": {"$or": [
+            {"$gt": ["$bb_access_token", ""]},
+            {"$gt": ["$bbms_config.access_token", ""]},
+        ]},
+    },
+    "checkout": {
+        "_id": 0,
+        "id": 1,
+        "name": 1,
+        "test_mode": 1,
+        "bb_access_token": 1,
+        "bbms_config.access_token": 1,
+        "bb_merchant_id": 1,
+        "bb_test_merchant_id": 1,
+        "bb_production_merchant_id": 1,
+    },
+}
@@ -1,6 +1,6 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, Header
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, Header, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -10,13 +10,36 @@ from pathlib import Path
 from pydantic import BaseModel, Field
 from typing import List, Dict, Optional
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from html import escape as html_escape
+import mimetypes
+import re
+import asyncio
+import tempfile
+import hashlib
+import time
 import httpx
 import json
 from cryptography.fernet import Fernet
 import base64
 from jose import JWTError, jwt
 import bcrypt
+from compression import CompressionMiddleware, PrecompressedBody, is_compressible, precompressed_response
+from org_cache import OrgCache
+from org_change_stream import OrgChangeWatcher
+from org_views import ORG_VIEW_PROJECTIONS
+from org_snapshot import OrgSnapshot
+from indexes import ensure_indexes
+from token_cache import DecryptedTokenCache
+from donation_writer import DonationWriteBehind
+from donation_fields import MAX_DONATION_AMOUNT, to_minor_units
+from donation_store import CHECKOUT_SESSION, DonationConflict, DonationStore, new_donation
+from donation_import import import_donations
+from donation_rollups import DonationRollups, daily_view
+from verification_worker import (
+    PENDING as PENDING_VERIFICATION, VerificationError, VerificationWorkerPool, new_verification_state
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -41,6 +64,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress dynamic responses (transaction lists, callback pages) above a size
+# threshold; embed pages and static bundles are served precompressed instead
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+)
+
 # Include API routes
 app.include_router(api_router)
 
@@ -61,10 +91,9 @@ async def test_callback_route():
     """Test callback route"""
     return {"message": "Test callback route is working"}
 
-# OAuth callback route - Move to API prefix to ensure it reaches backend
-@api_router.get("/blackbaud-callback")
-async def oauth_callback_page(code: str = None, state: str = None, error: str = None):
-    """OAuth callback page that handles the redirect and posts back to API"""
+def render_oauth_callback_page(code: Optional[str], state: Optional[str], error: Optional[str]) -> HTMLResponse:
+    """Page shell for the Blackbaud OAuth redirect; the logic lives in static/oauth-callback.js"""
+    callback_params = json_for_script({"code": code, "state": state, "error": error})
     return HTMLResponse(f"""
     <!DOCTYPE html>
     <html>
@@ -72,7 +101,7 @@ async def oauth_callback_page(code: str = None, state: str = None, error: str =
         <meta charset="utf-8">
         <meta name="viewport" content="width=device-width, initial-scale=1">
         <title>Blackbaud Authentication</title>
-        <script src="https://cdn.tailwindcss.com"></script>
+        {stylesheet_tag()}
     </head>
     <body class="bg-gray-50 flex items-center justify-center min-h-screen">
         <div class="bg-white rounded-lg shadow-lg p-8 max-w-md w-full mx-4">
@@ -82,9 +111,9 @@ async def oauth_callback_page(code: str = None, state: str = None, error: str =
                 <p class="text-gray-600">Please wait while we complete the authentication.</p>
                 <div id="debug-info" class="mt-4 text-xs text-gray-500 bg-gray-100 p-2 rounded">
                     <strong>🔍 OAuth Callback Debug Info:</strong><br>
-                    Code: <span class="font-mono">{code or 'Missing'}</span><br>
-                    State: <span class="font-mono">{state[:30] + '...' if state else 'Missing'}</span><br>
-                    Error: <span class="font-mono">{error or 'None'}</span>
+                    Code: <span class="font-mono">{html_escape(code or 'Missing')}</span><br>
+                    State: <span class="font-mono">{html_escape(state[:30] + '...' if state else 'Missing')}</span><br>
+                    Error: <span class="font-mono">{html_escape(error or 'None')}</span>
                 </div>
             </div>
             
@@ -108,130 +137,18 @@ async def oauth_callback_page(code: str = None, state: str = None, error: str =
             </div>
         </div>
         
-        <script>
-            console.log('🚀 OAuth Callback Page Loaded Successfully');
-            console.log('Current URL:', window.location.href);
-            
-            const urlParams = new URLSearchParams(window.location.search);
-            const code = urlParams.get('code') || '{code}';
-            const state = urlParams.get('state') || '{state}';
-            const error = urlParams.get('error') || '{error}';
-            
-            console.log('📋 Parameters received:', {{
-                code: code ? 'present (' + code.length + ' chars)' : 'missing',
-                state: state ? 'present (' + state.length + ' chars)' : 'missing',
-                error: error || 'none'
-            }});
-            
-            function showSuccess() {{
-                console.log('✅ Showing success state');
-                document.getElementById('loading').classList.add('hidden');
-                document.getElementById('success').classList.remove('hidden');
-            }}
-            
-            function showError(message, details = '') {{
-                console.error('❌ Error occurred:', message, details);
-                document.getElementById('loading').classList.add('hidden');
-                document.getElementById('error').classList.remove('hidden');
-                document.getElementById('error-message').textContent = message;
-                if (details) {{
-                    document.getElementById('error-details').textContent = details;
-                }}
-            }}
-            
-            function closeWindow() {{
-                console.log('🔄 Closing window and notifying parent...');
-                if (window.opener) {{
-                    const success = !document.getElementById('error').classList.contains('hidden');
-                    const errorMsg = success ? null : document.getElementById('error-message').textContent;
-                    
-                    console.log('📤 Sending message to parent:', {{ success, error: errorMsg }});
-                    
-                    window.opener.postMessage({{
-                        type: 'BLACKBAUD_AUTH_COMPLETE',
-                        success: success,
-                        error: errorMsg
-                    }}, '*');
-                    
-                    setTimeout(() => {{
-                        console.log('🔄 Closing popup window...');
-                        window.close();
-                    }}, 500);
-                }} else {{
-                    console.log('ℹ️ No opener window found, redirecting to main app');
-                    window.location.href = '/';
-                }}
-            }}
-            
-            async function handleCallback() {{
-                console.log('🔄 Starting OAuth callback processing...');
-                
-                if (error && error !== 'None') {{
-                    console.error('❌ OAuth error from Blackbaud:', error);
-                    showError(`Blackbaud OAuth Error: ${{error}}`);
-                    return;
-                }}
-                
-                if (!code || code === 'Missing' || !state || state === 'Missing') {{
-                    console.error('❌ Missing required OAuth parameters');
-                    showError('Missing authorization code or state parameter from Blackbaud.');
-                    return;
-                }}
-                
-                try {{
-                    const merchant_id = localStorage.getItem('bb_merchant_id') || '96563c2e-c97a-4db1-a0ed-1b2a8219f110';
-                    
-                    console.log('📡 Making API call to process OAuth callback...');
-                    console.log('🔍 Request details:', {{
-                        merchant_id: merchant_id,
-                        state_preview: state.substring(0, 30) + '...',
-                        code_preview: code.substring(0, 10) + '...'
-                    }});
-                    
-                    const response = await fetch('/api/organizations/bbms-oauth/callback', {{
-                        method: 'POST',
-                        headers: {{
-                            'Content-Type': 'application/json'
-                        }},
-                        body: JSON.stringify({{
-                            code: code,
-                            state: state,
-                            merchant_id: merchant_id
-                        }})
-                    }});
-                    
-                    console.log('📡 API Response status:', response.status);
-                    
-                    if (response.ok) {{
-                        const result = await response.json();
-                        console.log('✅ OAuth callback successful:', result);
-                        localStorage.removeItem('bb_merchant_id');
-                        showSuccess();
-                    }} else {{
-                        const errorData = await response.json();
-                        console.error('❌ API Error:', errorData);
-                        
-                        let errorMessage = errorData.detail || 'Authentication failed';
-                        if (errorMessage.includes('invalid_grant')) {{
-                            errorMessage = 'Authorization code expired. Please try the OAuth flow again quickly.';
-                        }}
-                        
-                        showError(errorMessage, `Status: ${{response.status}} - ${{JSON.stringify(errorData)}}`);
-                    }}
-                }} catch (err) {{
-                    console.error('❌ Network error:', err);
-                    showError('Network error during authentication', err.message);
-                }}
-            }}
-            
-            // Start processing immediately when page loads
-            console.log('🚀 Initiating OAuth callback processing...');
-            handleCallback();
-        </script>
+        <script id="callback-params" type="application/json">{callback_params}</script>
+        <script src="{static_url('oauth-callback.js')}"></script>
     </body>
     </html>
     """)
 
+# OAuth callback route - Move to API prefix to ensure it reaches backend
+@api_router.get("/blackbaud-callback")
+async def oauth_callback_page(code: str = None, state: str = None, error: str = None):
+    """OAuth callback page that handles the redirect and posts back to API"""
+    return render_oauth_callback_page(code, state, error)
+
 # Security
 security = HTTPBearer()
 JWT_SECRET = os.environ.get('JWT_SECRET', 'fallback_secret')
@@ -254,6 +171,17 @@ def encrypt_data(data: str) -> str:
 def decrypt_data(encrypted_data: str) -> str:
     return cipher_suite.decrypt(encrypted_data.encode()).decode()
 
+# Decrypted Blackbaud access tokens for the donation hot paths, keyed by
+# ciphertext; entries for an organization are dropped on every write to it
+access_token_cache = DecryptedTokenCache(
+    decrypt_data,
+    max_entries=int(os.environ.get('ACCESS_TOKEN_CACHE_MAX_ENTRIES', '256')),
+    ttl_seconds=float(os.environ.get('ACCESS_TOKEN_CACHE_TTL_SECONDS', '300'))
+)
+
+def decrypt_access_token(encrypted_token: str, org_id: str) -> str:
+    return access_token_cache.get(encrypted_token, org_id)
+
 # Models
 class OrganizationCreate(BaseModel):
     name: str
@@ -308,25 +236,12 @@ class BBMSOAuthCallback(BaseModel):
     merchant_id: str
 
 class DonationRequest(BaseModel):
-    amount: float = Field(..., gt=0)
+    amount: float = Field(..., gt=0, le=MAX_DONATION_AMOUNT)
     donor_email: str
     donor_name: str
     org_id: str
     custom_fields: Optional[Dict] = {}
 
-class DonationTransaction(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    session_id: Optional[str] = None
-    org_id: str
-    amount: float
-    donor_name: str
-    donor_email: str
-    status: str = "pending"  # pending, completed, failed, cancelled
-    bb_transaction_id: Optional[str] = None
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    completed_at: Optional[datetime] = None
-    metadata: Dict = Field(default_factory=dict)
-
 class AdminLogin(BaseModel):
     email: str
     password: str
@@ -518,20 +433,18 @@ class BlackbaudClient:
             # In a production environment, you would verify this token with Blackbaud
             
             # Store the successful donation in our database
-            donation_record = {
-                "id": str(uuid.uuid4()),
-                "organization_id": organization_id,
-                "amount": donation_data.get("amount"),
-                "donor_email": donation_data.get("donor_email"),
-                "donor_name": donation_data.get("donor_name"),
-                "transaction_token": token,
-                "status": "completed",
-                "payment_method": "blackbaud_checkout",
-                "created_at": datetime.utcnow().isoformat(),
-                "test_mode": True  # Currently in sandbox mode
-            }
+            donation_record = new_donation(
+                organization_id,
+                donation_amount_cents(donation_data),
+                donation_data.get("donor_name"),
+                donation_data.get("donor_email"),
+                status="completed",
+                payment_method="blackbaud_checkout",
+                test_mode=True,  # Currently in sandbox mode
+                transaction_token=token
+            )
             
-            await db["donations"].insert_one(donation_record)
+            donation_record = await record_donation(donation_record)
             
             logging.info(f"Donation recorded successfully: {donation_record['id']} for ${donation_data.get('amount')}")
             
@@ -543,6 +456,8 @@ class BlackbaudClient:
                 "message": "Donation processed successfully"
             }
                 
+        except HTTPException:
+            raise
         except Exception as e:
             logging.error(f"Error processing transaction token: {str(e)}")
             raise HTTPException(500, f"Failed to process transaction: {str(e)}")
@@ -667,21 +582,19 @@ class BlackbaudClient:
                     transaction_result = response.json()
                     
                     # Store the successful donation in our database
-                    donation_record = {
-                        "id": str(uuid.uuid4()),
-                        "organization_id": organization_id,
-                        "amount": donation_data.get("amount"),
-                        "donor_email": donation_data.get("donor_email"),
-                        "donor_name": donation_data.get("donor_name"),
-                        "transaction_token": token,
-                        "transaction_id": transaction_result.get("id"),
-                        "status": "completed",
-                        "payment_method": "blackbaud_checkout",
-                        "created_at": datetime.utcnow().isoformat(),
-                        "blackbaud_response": transaction_result
-                    }
+                    donation_record = new_donation(
+                        organization_id,
+                        donation_amount_cents(donation_data),
+                        donation_data.get("donor_name"),
+                        donation_data.get("donor_email"),
+                        status="completed",
+                        payment_method="blackbaud_checkout",
+                        transaction_token=token,
+                        transaction_id=transaction_result.get("id"),
+                        blackbaud_response=transaction_result
+                    )
                     
-                    await db["donations"].insert_one(donation_record)
+                    donation_record = await record_donation(donation_record)
                     
                     logging.info(f"Donation recorded successfully: {donation_record['id']}")
                     return {
@@ -695,10 +608,47 @@ class BlackbaudClient:
                     logging.error(f"Transaction processing failed: {response.status_code} - {error_text}")
                     raise HTTPException(400, f"Transaction processing failed: {error_text}")
                     
+        except HTTPException:
+            raise
         except Exception as e:
             logging.error(f"Error processing transaction token: {str(e)}")
             raise HTTPException(500, f"Failed to process transaction: {str(e)}")
 
+    async def verify_transaction_token(self, token: str, access_token: str, merchant_id: Optional[str]) -> dict:
+        """
+        Verify a checkout transaction token with Blackbaud and return the transaction.
+        Raises VerificationError; retryable unless Blackbaud rejected the token.
+        """
+        subscription_key = os.environ.get('BB_PAYMENT_API_SUBSCRIPTION')
+        headers = {
+            "Bb-Api-Subscription-Key": subscription_key,
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json"
+        }
+        transaction_data = {
+            "transaction_token": token,
+            "merchant_account_id": merchant_id or os.environ.get('BB_MERCHANT_ACCOUNT_ID')
+        }
+        try:
+            async with httpx.AsyncClient() as client:
+                response = await client.post(
+                    "https://api.sky.blackbaud.com/payments/transactions",
+                    headers=headers,
+                    json=transaction_data,
+                    timeout=30.0
+                )
+        except httpx.HTTPError as e:
+            raise VerificationError(f"Blackbaud request failed: {str(e)}")
+        
+        if response.status_code in (200, 201):
+            return response.json()
+        # Timeouts, throttling and server errors are worth another try
+        retryable = response.status_code >= 500 or response.status_code in (408, 429)
+        raise VerificationError(
+            f"Transaction verification failed: {response.status_code} - {response.text[:500]}",
+            retryable=retryable
+        )
+
 bb_client = BlackbaudClient()
 
 # Helper functions
@@ -719,11 +669,301 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     except JWTError:
         raise HTTPException(401, "Invalid authentication")
 
-async def get_organization(org_id: str) -> Organization:
-    org_data = await db.organizations.find_one({"id": org_id})
-    if not org_data:
+# Organization documents for the public hot paths. Every write to an
+# organization goes through invalidate_org_caches(), and writes made by other
+# workers arrive through the organizations change stream (see
+# org_change_stream.py), so the TTL only matters when that stream is down.
+async def fetch_organization(org_id: str, view: str = "full") -> Optional[OrgSnapshot]:
+    doc = await db["organizations"].find_one({"id": org_id}, ORG_VIEW_PROJECTIONS[view])
+    return OrgSnapshot.from_document(doc) if doc else None
+
+org_cache = OrgCache(
+    fetch_organization,
+    max_entries=int(os.environ.get('ORG_CACHE_MAX_ENTRIES', '1000')),
+    ttl_seconds=float(os.environ.get('ORG_CACHE_TTL_SECONDS', '60')),
+    negative_max_entries=int(os.environ.get('ORG_CACHE_NEGATIVE_MAX_ENTRIES', '10000')),
+    negative_ttl_seconds=float(os.environ.get('ORG_CACHE_NEGATIVE_TTL_SECONDS', '30'))
+)
+
+# Public paths load a snapshot of a projected view instead of the whole
+# document (see org_views.py and org_snapshot.py)
+async def load_checkout_view(org_id: str) -> Optional[OrgSnapshot]:
+    return await org_cache.get(org_id, "checkout")
+
+async def load_embed_view(org_id: str) -> Optional[OrgSnapshot]:
+    return await org_cache.get(org_id, "embed")
+
+async def load_form_view(org_id: str) -> Optional[OrgSnapshot]:
+    return await org_cache.get(org_id, "form")
+
+async def get_organization(org_id: str) -> OrgSnapshot:
+    organization = await org_cache.get(org_id)
+    if not organization:
         raise HTTPException(404, "Organization not found")
-    return Organization(**org_data)
+    return organization
+
+# Inline the public form config into the embed page as a JSON island instead of
+# having the iframe fetch it after load. Set to "false" to go back to fetching.
+EMBED_INLINE_FORM_CONFIG = os.environ.get('EMBED_INLINE_FORM_CONFIG', 'true').lower() == 'true'
+
+def json_for_script(data) -> str:
+    """Serialize data for a <script type="application/json"> block"""
+    return (
+        json.dumps(data)
+        .replace("<", "\\u003c")
+        .replace(">", "\\u003e")
+        .replace("&", "\\u0026")
+    )
+
+# Rendered embed pages, stored per org id. Each entry remembers the org id, test
+# mode and updated_at it was rendered from, and a lookup only returns it while
+# the current snapshot still matches; writes to the organization also drop the
+# entry through invalidate_org_caches(). Entries expire with the org cache TTL
+# so they follow its change-stream fallback.
+EMBED_CACHE_MAX_ENTRIES = int(os.environ.get('EMBED_CACHE_MAX_ENTRIES', '1000'))
+embed_page_cache: Dict[str, Dict] = {}
+
+def embed_cache_key(org: OrgSnapshot) -> tuple:
+    return (org.id, org.test_mode, org.updated_at)
+
+def get_cached_embed_page(org: OrgSnapshot) -> Optional[Dict]:
+    entry = embed_page_cache.get(org.id)
+    if entry is None:
+        return None
+    if entry["key"] != embed_cache_key(org) or entry["expires_at"] <= time.monotonic():
+        embed_page_cache.pop(org.id, None)
+        return None
+    return entry
+
+def store_embed_page(org: OrgSnapshot, html: str, etag: str, last_modified: Optional[str]) -> Dict:
+    if len(embed_page_cache) >= EMBED_CACHE_MAX_ENTRIES:
+        # Evict the oldest render (dicts keep insertion order)
+        embed_page_cache.pop(next(iter(embed_page_cache)), None)
+    entry = {
+        "key": embed_cache_key(org),
+        "body": PrecompressedBody(html.encode()),
+        "etag": etag,
+        "last_modified": last_modified,
+        "expires_at": time.monotonic() + org_cache.ttl_seconds
+    }
+    embed_page_cache[org.id] = entry
+    return entry
+
+def cached_embed_response(request: Optional[Request], entry: Dict) -> Response:
+    return precompressed_response(
+        request, entry["body"], "text/html; charset=utf-8",
+        validator_headers(entry["etag"], entry["last_modified"])
+    )
+
+# Static bundles for the embed and callback pages. Each file under static/ is
+# served under a content-hashed name with an immutable Cache-Control, so pages
+# only carry a small per-org bootstrap and repeat visitors reuse their copy.
+STATIC_DIR = ROOT_DIR / 'static'
+STATIC_CACHE_CONTROL = "public, max-age=31536000, immutable"
+EMBED_API_BASE = 'https://giftflow.preview.emergentagent.com/api'
+
+def load_static_assets() -> Dict[str, Dict]:
+    assets = {}
+    for path in sorted(STATIC_DIR.iterdir()):
+        if not path.is_file():
+            continue
+        body = path.read_bytes()
+        digest = hashlib.sha256(body).hexdigest()[:12]
+        media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        assets[path.name] = {
+            "hashed_name": f"{path.stem}.{digest}{path.suffix}",
+            "digest": digest,
+            "body": PrecompressedBody(body) if is_compressible(media_type) else body,
+            "media_type": media_type
+        }
+    return assets
+
+static_assets = load_static_assets()
+static_assets_by_hashed_name = {asset["hashed_name"]: asset for asset in static_assets.values()}
+
+def static_url(name: str) -> str:
+    return f"/api/static/{static_assets[name]['hashed_name']}"
+
+def stylesheet_tag() -> str:
+    """The compiled Tailwind stylesheet (yarn build:embed-css), or the runtime CDN when it hasn't been built"""
+    if "embed.css" in static_assets:
+        return f'<link rel="stylesheet" href="{static_url("embed.css")}">'
+    return '<script src="https://cdn.tailwindcss.com"></script>'
+
+# Conditional GET support for the public embed and form-config endpoints.
+# RENDER_VERSION changes whenever the templates in this file or the static
+# bundles they reference change, so a deploy never leaves browsers revalidating
+# against an old page.
+RENDER_VERSION = hashlib.sha256(
+    Path(__file__).read_bytes() + "".join(sorted(a["digest"] for a in static_assets.values())).encode()
+).hexdigest()[:16]
+
+def compute_etag(*parts) -> str:
+    payload = json.dumps([RENDER_VERSION, *parts], sort_keys=True, default=str)
+    return '"' + hashlib.sha256(payload.encode()).hexdigest()[:32] + '"'
+
+def http_date(value) -> Optional[str]:
+    if not isinstance(value, datetime):
+        return None
+    # Mongo hands back naive UTC datetimes
+    return format_datetime(value.replace(microsecond=0, tzinfo=timezone.utc), usegmt=True)
+
+def validator_headers(etag: str, last_modified: Optional[str]) -> Dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified:
+        headers["Last-Modified"] = last_modified
+    return headers
+
+def is_not_modified(request: Optional[Request], etag: str, last_modified: Optional[str]) -> bool:
+    """Evaluate If-None-Match / If-Modified-Since (If-None-Match wins when both are sent)"""
+    if request is None:
+        return False
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def not_modified_response(etag: str, last_modified: Optional[str]) -> Response:
+    return Response(status_code=304, headers=validator_headers(etag, last_modified))
+
+def org_validators(kind: str, org: OrgSnapshot, *extra) -> tuple:
+    """ETag and Last-Modified for a page or payload derived from an organization"""
+    etag = compute_etag(kind, org.id, org.test_mode, org.updated_at, org.form_settings, *extra)
+    return etag, http_date(org.updated_at)
+
+async def invalidate_org_caches(org_id: str) -> None:
+    """Drop everything cached from an organization document after a write"""
+    org_cache.invalidate(org_id)
+    access_token_cache.invalidate_org(org_id)
+    embed_page_cache.pop(org_id, None)
+    # Also runs for writes reported by the change stream, so every node's
+    # export directory follows; each export writes through its own temp file
+    if EMBED_EXPORT_DIR:
+        try:
+            await export_embed_page(org_id)
+        except Exception as e:
+            # The stale file is already gone, so nginx falls back to the backend
+            logging.error(f"Failed to re-export embed page for {org_id}: {e}")
+
+def reset_org_caches() -> None:
+    """Drop every cached organization and rendered embed page"""
+    org_cache.clear()
+    access_token_cache.clear()
+    embed_page_cache.clear()
+
+# Invalidations for writes made by other workers. Needs a replica set; on a
+# standalone mongod the org cache drops to ORG_CACHE_FALLBACK_TTL_SECONDS.
+ORG_CHANGE_STREAM = os.environ.get('ORG_CHANGE_STREAM', 'true').lower() == 'true'
+org_change_watcher = OrgChangeWatcher(
+    lambda: db["organizations"],
+    invalidate_org_caches,
+    reset_org_caches,
+    org_cache,
+    fallback_ttl_seconds=float(os.environ.get('ORG_CACHE_FALLBACK_TTL_SECONDS', '5'))
+)
+
+# Donation records are journaled locally and written to Mongo in batches (see
+# donation_writer.py). DONATION_WRITE_BEHIND=false inserts them in the request.
+DONATION_WRITE_BEHIND = os.environ.get('DONATION_WRITE_BEHIND', 'true').lower() == 'true'
+# Daily totals of completed donations for the dashboard (see donation_rollups.py)
+donation_rollups = DonationRollups(lambda: db)
+donation_writer = DonationWriteBehind(
+    lambda: db["donations"],
+    Path(os.environ.get('DONATION_JOURNAL_DIR', str(ROOT_DIR / 'donation-journal'))),
+    batch_size=int(os.environ.get('DONATION_FLUSH_BATCH_SIZE', '200')),
+    flush_interval=float(os.environ.get('DONATION_FLUSH_INTERVAL_SECONDS', '0.05')),
+    on_inserted=donation_rollups.add
+)
+
+# Every read and write of donations goes through the store (donation_store.py)
+donation_store = DonationStore(
+    lambda: db["donations"], donation_writer if DONATION_WRITE_BEHIND else None, donation_rollups
+)
+
+def donation_amount_cents(donation_data: dict) -> Optional[int]:
+    """The donation amount from a request, in integer cents as it's stored"""
+    try:
+        amount_cents = to_minor_units(donation_data.get("amount"))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if amount_cents is not None and amount_cents <= 0:
+        raise HTTPException(400, "Donation amount must be greater than zero")
+    return amount_cents
+
+async def record_donation(donation: dict) -> dict:
+    """Store a donation (see DonationStore.record); 409 if its token belongs to another donation"""
+    try:
+        return await donation_store.record(donation)
+    except DonationConflict as e:
+        raise HTTPException(409, str(e))
+
+def replayed_donation_response(donation: dict) -> Dict:
+    return {
+        "success": True,
+        "donation_id": donation["id"],
+        "transaction_token": donation.get("transaction_token"),
+        "status": donation.get("status", "completed"),
+        "message": "Donation already recorded"
+    }
+
+@app.on_event("startup")
+async def start_donation_writer():
+    # Also replays anything a crashed worker left in the journal
+    if DONATION_WRITE_BEHIND:
+        await donation_writer.start()
+
+async def stop_donation_writer():
+    if DONATION_WRITE_BEHIND:
+        await donation_writer.stop()
+
+# Flush before shutdown_db_client closes the Mongo client
+app.router.on_shutdown.insert(0, stop_donation_writer)
+
+async def verify_donation(donation: dict) -> Dict:
+    """Verify a pending donation's transaction token; returns the fields to record"""
+    org = await load_checkout_view(donation["organization_id"])
+    if not org or not org.encrypted_access_token:
+        raise VerificationError("Organization not found or has no Blackbaud access", retryable=False)
+    access_token = decrypt_access_token(org.encrypted_access_token, org.id)
+    
+    transaction_result = await bb_client.verify_transaction_token(
+        donation["transaction_token"], access_token, org.merchant_id
+    )
+    logging.info(f"Donation verified: {donation['id']}")
+    return {
+        "transaction_id": transaction_result.get("id"),
+        "blackbaud_response": transaction_result
+    }
+
+# process-transaction records donations as pending_verification and this pool
+# verifies them with Blackbaud in the background (see verification_worker.py).
+# TRANSACTION_VERIFICATION=false records them as completed unverified, as before.
+TRANSACTION_VERIFICATION = os.environ.get('TRANSACTION_VERIFICATION', 'true').lower() == 'true'
+verification_pool = VerificationWorkerPool(
+    lambda: db["donations"],
+    verify_donation,
+    concurrency=int(os.environ.get('VERIFICATION_WORKERS', '4')),
+    max_attempts=int(os.environ.get('VERIFICATION_MAX_ATTEMPTS', '5')),
+    on_completed=lambda donation: donation_rollups.add([donation])
+)
+
+@app.on_event("startup")
+async def start_verification_pool():
+    if TRANSACTION_VERIFICATION:
+        verification_pool.start()
+
+async def stop_verification_pool():
+    await verification_pool.stop()
+
+# Workers must be idle before the Mongo client goes away
+app.router.on_shutdown.insert(0, stop_verification_pool)
 
 # API Routes
 @api_router.post("/organizations/register")
@@ -753,6 +993,8 @@ async def register_organization(org_data: OrganizationCreate):
         )
         
         await db.organizations.insert_one(organization.dict())
+        # Forget any earlier lookup of this id that found nothing
+        await invalidate_org_caches(organization.id)
         
         # Create access token
         access_token = create_access_token({"org_id": organization.id})
@@ -831,6 +1073,7 @@ async def start_bbms_oauth(
                 }
             }
         )
+        await invalidate_org_caches(org_id)
         
         # Generate OAuth URL using user's app credentials
         from urllib.parse import urlencode
@@ -992,6 +1235,7 @@ async def handle_bbms_oauth_callback(callback_data: BBMSOAuthCallback):
             {"id": org_id},
             {"$set": update_data}
         )
+        await invalidate_org_caches(org_id)
         
         logging.info(f"Organization update result: {result.modified_count} documents modified")
         
@@ -1072,6 +1316,7 @@ async def manual_token_test(
                 }
             }
         )
+        await invalidate_org_caches(org_id)
         
         return {"message": "Manual token stored successfully (test mode)"}
         
@@ -1128,6 +1373,7 @@ async def configure_bbms(
             }
         }
     )
+    await invalidate_org_caches(org_id)
     
     return {"message": "BBMS credentials configured successfully"}
 
@@ -1147,6 +1393,7 @@ async def setup_bbms_merchant_ids(
             }
         }
     )
+    await invalidate_org_caches(org_id)
     
     logging.info(f"BBMS setup update result: matched={result.matched_count}, modified={result.modified_count}")
     
@@ -1175,6 +1422,7 @@ async def request_password_reset(request: PasswordResetRequest):
                 }
             }
         )
+        await invalidate_org_caches(org["id"])
         
         # In a real app, you'd send this via email
         # For demo purposes, we'll log it (check backend logs)
@@ -1224,6 +1472,7 @@ async def reset_password(reset: PasswordReset):
                 }
             }
         )
+        await invalidate_org_caches(org["id"])
         
         logging.info(f"Password reset successful for {reset.email}")
         return {"message": "Password reset successfully"}
@@ -1237,14 +1486,14 @@ async def reset_password(reset: PasswordReset):
 @app.get("/api/developer-instructions")
 async def get_developer_instructions():
     """Get setup instructions for SKY App Developers"""
-    return HTMLResponse("""
+    return HTMLResponse(f"""
     <!DOCTYPE html>
     <html>
     <head>
         <meta charset="utf-8">
         <meta name="viewport" content="width=device-width, initial-scale=1">
         <title>SKY App Developer Setup Instructions</title>
-        <script src="https://cdn.tailwindcss.com"></script>
+        {stylesheet_tag()}
     </head>
     <body class="bg-gray-50 min-h-screen py-8">
         <div class="max-w-4xl mx-auto px-4">
@@ -1283,7 +1532,7 @@ async def get_developer_instructions():
                             <ul class="list-disc list-inside text-gray-600 space-y-1">
                                 <li>Enable <strong>"Payments API"</strong></li>
                                 <li>Enable <strong>"OAuth 2.0"</strong></li>
-                                <li>Set Redirect URI to: <code class="bg-gray-100 px-2 py-1 rounded text-sm">${window.location.origin}/api/blackbaud-callback</code></li>
+                                <li>Set Redirect URI to: <code class="bg-gray-100 px-2 py-1 rounded text-sm">${{window.location.origin}}/api/blackbaud-callback</code></li>
                             </ul>
                             <div class="bg-yellow-100 border border-yellow-300 rounded p-3 mt-2">
                                 <p class="text-yellow-800 text-sm">
@@ -1309,7 +1558,7 @@ async def get_developer_instructions():
                         <pre class="text-sm"><code># Blackbaud SKY API Configuration
 BB_APPLICATION_ID="your-application-id-here"
 BB_APPLICATION_SECRET="your-application-secret-here"
-BB_REDIRECT_URI="${window.location.origin}/api/blackbaud-callback"
+BB_REDIRECT_URI="${{window.location.origin}}/api/blackbaud-callback"
 
 # These can use demo values for platform testing
 BB_PUBLIC_KEY="737471a1-1e7e-40ab-aa3a-97d0fb806e6f"
@@ -1411,6 +1660,7 @@ async def update_form_settings(
             }
         }
     )
+    await invalidate_org_caches(org_id)
     
     return {"message": "Form settings updated successfully"}
 
@@ -1429,6 +1679,7 @@ async def toggle_test_mode(
             }
         }
     )
+    await invalidate_org_caches(org_id)
     
     mode_text = "test" if toggle_data.test_mode else "production"
     return {"message": f"Switched to {mode_text} mode successfully"}
@@ -1462,29 +1713,17 @@ async def create_donation(donation: DonationRequest, authorization: str = Header
         
         # Get organization
         logging.info(f"Fetching organization with ID: {organization_id}")
-        org = await db["organizations"].find_one({"id": organization_id})
+        org = await load_checkout_view(organization_id)
         if not org:
             logging.error(f"Organization not found: {organization_id}")
             raise HTTPException(404, "Organization not found")
         
-        logging.info(f"Organization found: {org.get('name', 'Unknown')}")
-        logging.info(f"Organization data keys: {list(org.keys())}")
+        logging.info(f"Organization found: {org.name or 'Unknown'}")
         
-        # Get BBMS configuration - check both new and legacy formats
-        encrypted_access_token = org.get("bb_access_token")  # New format (OAuth2 and manual)
-        if not encrypted_access_token:
-            # Legacy format fallback
-            bbms_config = org.get("bbms_config", {})
-            encrypted_access_token = bbms_config.get("access_token")
-        
-        # Get organization's test mode setting
-        org_test_mode = org.get("test_mode", True)
-        
-        # Get appropriate merchant ID based on mode
-        if org_test_mode:
-            merchant_id = org.get("bb_test_merchant_id") or org.get("bb_merchant_id")  # Fallback to legacy
-        else:
-            merchant_id = org.get("bb_production_merchant_id") or org.get("bb_merchant_id")  # Fallback to legacy
+        # Token and per-mode merchant ID, legacy formats already resolved
+        encrypted_access_token = org.encrypted_access_token
+        org_test_mode = org.test_mode
+        merchant_id = org.merchant_id
         
         logging.info(f"=== MODE SETTINGS ===")
         logging.info(f"Organization {organization_id} test_mode setting: {org_test_mode}")
@@ -1498,7 +1737,7 @@ async def create_donation(donation: DonationRequest, authorization: str = Header
             raise HTTPException(400, "Organization has not configured Blackbaud BBMS access")
 
         # Decrypt the access token
-        access_token = decrypt_data(encrypted_access_token)
+        access_token = decrypt_access_token(encrypted_access_token, organization_id)
         
         # Create checkout configuration for frontend using organization's mode setting
         checkout_config = await bb_client.create_payment_checkout(
@@ -1530,14 +1769,14 @@ async def create_test_donation(donation: DonationRequest):
         
         # If we have a real organization ID, get their test mode setting
         if org_id != "test-org-id":
-            org = await db["organizations"].find_one({"id": org_id})
+            org = await load_checkout_view(org_id)
             if org:
-                org_test_mode = org.get("test_mode", True)
+                org_test_mode = org.test_mode
                 # Use organization's test merchant ID if available
-                if org_test_mode and org.get("bb_test_merchant_id"):
-                    merchant_id = org.get("bb_test_merchant_id")
-                elif not org_test_mode and org.get("bb_production_merchant_id"):
-                    merchant_id = org.get("bb_production_merchant_id")
+                if org_test_mode and org.test_merchant_id:
+                    merchant_id = org.test_merchant_id
+                elif not org_test_mode and org.production_merchant_id:
+                    merchant_id = org.production_merchant_id
                 else:
                     # Fallback to demo test merchant ID
                     merchant_id = "96563c2e-c97a-4db1-a0ed-1b2a8219f110"  # Demo test merchant ID
@@ -1586,7 +1825,7 @@ async def create_test_donation(donation: DonationRequest):
 
 
 @api_router.post("/test-process-transaction")
-async def process_test_transaction(request: dict):
+async def process_test_transaction(request: dict, idempotency_key: Optional[str] = Header(None)):
     """Process a test transaction token (demonstration purposes)"""
     try:
         transaction_token = request.get("transaction_token")
@@ -1595,21 +1834,25 @@ async def process_test_transaction(request: dict):
         if not transaction_token:
             raise HTTPException(400, "Transaction token is required")
         
+        organization_id = donation_data.get("org_id", "test-org-id")
+        existing = await donation_store.find_recorded(organization_id, transaction_token, idempotency_key)
+        if existing:
+            return replayed_donation_response(existing)
+        
         # Create test donation record
-        donation_record = {
-            "id": str(uuid.uuid4()),
-            "organization_id": donation_data.get("org_id", "test-org-id"),
-            "amount": donation_data.get("amount"),
-            "donor_email": donation_data.get("donor_email"),
-            "donor_name": donation_data.get("donor_name"),
-            "transaction_token": transaction_token,
-            "status": "completed",
-            "payment_method": "blackbaud_checkout_test",
-            "created_at": datetime.utcnow().isoformat(),
-            "test_mode": True
-        }
+        donation_record = new_donation(
+            organization_id,
+            donation_amount_cents(donation_data),
+            donation_data.get("donor_name"),
+            donation_data.get("donor_email"),
+            status="completed",
+            payment_method="blackbaud_checkout_test",
+            test_mode=True,
+            transaction_token=transaction_token,
+            idempotency_key=idempotency_key
+        )
         
-        await db["donations"].insert_one(donation_record)
+        donation_record = await record_donation(donation_record)
         
         logging.info(f"Test donation recorded: {donation_record['id']} for ${donation_data.get('amount')}")
         
@@ -1621,6 +1864,8 @@ async def process_test_transaction(request: dict):
             "message": "Test donation processed successfully"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error in process_test_transaction: {str(e)}")
         raise HTTPException(500, f"Internal server error: {str(e)}")
@@ -1629,7 +1874,8 @@ async def process_test_transaction(request: dict):
 @api_router.post("/process-transaction")
 async def process_transaction(
     request: dict,
-    authorization: str = Header(None)
+    authorization: str = Header(None),
+    idempotency_key: Optional[str] = Header(None)
 ):
     """Process a completed Blackbaud checkout transaction token"""
     try:
@@ -1656,44 +1902,40 @@ async def process_transaction(
         if not organization_id:
             raise HTTPException(400, "Organization ID required")
         
+        # Retries after a network blip get the donation recorded the first time
+        existing = await donation_store.find_recorded(organization_id, transaction_token, idempotency_key)
+        if existing:
+            return replayed_donation_response(existing)
+        
         # Get organization and access token
-        org = await db["organizations"].find_one({"id": organization_id})
+        org = await load_checkout_view(organization_id)
         if not org:
             raise HTTPException(404, "Organization not found")
         
-        # Get BBMS configuration - check both new and legacy formats
-        encrypted_access_token = org.get("bb_access_token")  # New format (OAuth2 and manual)
-        if not encrypted_access_token:
-            # Legacy format fallback
-            bbms_config = org.get("bbms_config", {})
-            encrypted_access_token = bbms_config.get("access_token")
-        
-        if not encrypted_access_token:
+        if not org.encrypted_access_token:
             raise HTTPException(400, "Organization has not configured Blackbaud BBMS access")
         
-        access_token = decrypt_data(encrypted_access_token)
-        
         logging.info(f"Processing transaction token: {transaction_token[:8]}...")
         
-        # For production transactions processed via JavaScript SDK,
-        # we record the successful transaction without API verification
-        # since the payment was already processed by Blackbaud's client-side SDK
-        
-        # Store the successful donation in our database
-        donation_record = {
-            "id": str(uuid.uuid4()),
-            "organization_id": organization_id,
-            "amount": donation_data.get("amount"),
-            "donor_email": donation_data.get("donor_email"),
-            "donor_name": donation_data.get("donor_name"),
-            "transaction_token": transaction_token,
-            "status": "completed",
-            "payment_method": "blackbaud_checkout",
-            "created_at": datetime.utcnow().isoformat(),
-            "test_mode": org.get("test_mode", True)
-        }
+        # The token is verified with Blackbaud by the background verification
+        # pool, so the donor doesn't wait on the payments API
+        status = PENDING_VERIFICATION if TRANSACTION_VERIFICATION else "completed"
+        donation_record = new_donation(
+            organization_id,
+            donation_amount_cents(donation_data),
+            donation_data.get("donor_name"),
+            donation_data.get("donor_email"),
+            status=status,
+            payment_method="blackbaud_checkout",
+            test_mode=org.test_mode,
+            transaction_token=transaction_token,
+            idempotency_key=idempotency_key,
+            verification=new_verification_state() if TRANSACTION_VERIFICATION else None
+        )
         
-        await db["donations"].insert_one(donation_record)
+        donation_record = await record_donation(donation_record)
+        if TRANSACTION_VERIFICATION:
+            verification_pool.notify()
         
         logging.info(f"Donation recorded successfully: {donation_record['id']} for ${donation_data.get('amount')}")
         
@@ -1701,8 +1943,9 @@ async def process_transaction(
             "success": True,
             "donation_id": donation_record["id"],
             "transaction_token": transaction_token,
-            "status": "completed",
-            "message": "Donation processed successfully"
+            "status": donation_record["status"],
+            "message": "Donation received and pending verification"
+                if donation_record["status"] == PENDING_VERIFICATION else "Donation processed successfully"
         }
         
     except HTTPException:
@@ -1715,34 +1958,33 @@ async def process_transaction(
 async def create_donation_checkout(donation: DonationRequest):
     """Create a checkout session for donation"""
     # Get organization
-    org_data = await db.organizations.find_one({"id": donation.org_id})
-    if not org_data:
+    org = await load_checkout_view(donation.org_id)
+    if not org:
         raise HTTPException(404, "Organization not found")
     
-    organization = Organization(**org_data)
-    
-    if not organization.bb_access_token or not organization.bb_merchant_id:
+    if not org.encrypted_access_token or not org.merchant_id:
         raise HTTPException(400, "Organization has not configured payment processing")
     
     # Decrypt access token
-    access_token = decrypt_data(organization.bb_access_token)
+    access_token = decrypt_access_token(org.encrypted_access_token, org.id)
     
     # Create checkout session using organization's test mode setting
     checkout_response = await bb_client.create_payment_checkout(
-        donation, organization.bb_merchant_id, access_token, organization.test_mode
+        donation, org.merchant_id, access_token, org.test_mode
     )
     
-    # Store transaction
-    transaction = DonationTransaction(
+    # Store the pending donation for the donor's status polling
+    await donation_store.insert_checkout_session(new_donation(
+        donation.org_id,
+        to_minor_units(donation.amount),
+        donation.donor_name,
+        donation.donor_email,
+        status="pending",
+        payment_method=CHECKOUT_SESSION,
+        test_mode=org.test_mode,
         session_id=checkout_response.get("id"),
-        org_id=donation.org_id,
-        amount=donation.amount,
-        donor_name=donation.donor_name,
-        donor_email=donation.donor_email,
         metadata=donation.custom_fields or {}
-    )
-    
-    await db.transactions.insert_one(transaction.dict())
+    ))
     
     return {
         "session_id": checkout_response.get("id"),
@@ -1751,1003 +1993,419 @@ async def create_donation_checkout(donation: DonationRequest):
 
 @api_router.get("/donations/status/{session_id}")
 async def get_donation_status(session_id: str):
-    """Get donation status"""
-    transaction = await db.transactions.find_one({"session_id": session_id})
-    if not transaction:
+    """Get donation status, by checkout session ID or donation ID"""
+    donation = await donation_store.find_by_reference(session_id)
+    if not donation:
         raise HTTPException(404, "Transaction not found")
     
+    status = {
+        "status": donation["status"],
+        "amount": donation.get("amount"),
+        "donor_name": donation.get("donor_name"),
+        "created_at": donation["created_at"]
+    }
+    verification = donation.get("verification")
+    if verification:
+        status["verification_attempts"] = verification.get("attempts", 0)
+        status["verification_error"] = verification.get("last_error")
+    return status
+
+def build_donation_form_config(org: OrgSnapshot) -> Dict:
+    """Public form configuration, shared by the JSON endpoint and the embed page"""
+    form_settings = org.form_settings
     return {
-        "status": transaction["status"],
-        "amount": transaction["amount"],
-        "donor_name": transaction["donor_name"],
-        "created_at": transaction["created_at"]
+        "organization_name": org.name,
+        "description": form_settings.get("organization_description", ""),
+        "preset_amounts": list(org.preset_amounts),
+        "custom_amount_enabled": form_settings.get("custom_amount_enabled", True),
+        "required_fields": form_settings.get("required_fields", ["name", "email"])
     }
 
 @api_router.get("/organizations/{org_id}/donation-form")
-async def get_donation_form_config(org_id: str):
+async def get_donation_form_config(org_id: str, request: Request, response: Response):
     """Get donation form configuration for public use"""
-    organization = await get_organization(org_id)
+    org = await load_form_view(org_id)
+    if not org:
+        raise HTTPException(404, "Organization not found")
     
-    return {
-        "organization_name": organization.name,
-        "description": organization.form_settings.get("organization_description", ""),
-        "preset_amounts": sorted(organization.form_settings.get("preset_amounts", [25, 50, 100])),
-        "custom_amount_enabled": organization.form_settings.get("custom_amount_enabled", True),
-        "required_fields": organization.form_settings.get("required_fields", ["name", "email"])
-    }
+    etag, last_modified = org_validators("form-config", org, org.name)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    response.headers.update(validator_headers(etag, last_modified))
+    
+    return build_donation_form_config(org)
 
 @api_router.get("/organizations/{org_id}/transactions")
 async def get_organization_transactions(
     org_id: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    current_org: str = Depends(verify_token)
+):
+    """Get a page of transactions for organization, newest first (admin only)"""
+    if org_id != current_org:
+        raise HTTPException(403, "Access denied")
+    
+    try:
+        transactions, next_cursor = await donation_store.list_for_organization(org_id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    
+    # Pass next_cursor back as ?cursor= for the following page
+    return {
+        "transactions": transactions,
+        "next_cursor": next_cursor,
+        "has_more": next_cursor is not None
+    }
+
+@api_router.get("/organizations/{org_id}/stats")
+async def get_organization_stats(
+    org_id: str,
+    days: int = Query(7, ge=1, le=366),
+    current_org: str = Depends(verify_token)
+):
+    """Dashboard totals for the organization's completed donations (admin only)"""
+    if org_id != current_org:
+        raise HTTPException(403, "Access denied")
+    
+    # O(days) rollup documents once the organization has been rebuilt
+    return await donation_rollups.stats(org_id, recent_days=days)
+
+@api_router.get("/organizations/{org_id}/stats/daily")
+async def get_organization_daily_stats(
+    org_id: str,
+    days: int = Query(30, ge=1, le=3660),
+    current_org: str = Depends(verify_token)
+):
+    """Per-day totals of completed donations for charts (admin only)"""
+    if org_id != current_org:
+        raise HTTPException(403, "Access denied")
+    
+    since = datetime.utcnow() - timedelta(days=days - 1)
+    return [daily_view(day) for day in await donation_rollups.daily(org_id, since=since)]
+
+@api_router.post("/organizations/{org_id}/donations/import")
+async def import_organization_donations(
+    org_id: str,
+    request: Request,
+    format: Optional[str] = None,
+    max_errors: int = 100,
     current_org: str = Depends(verify_token)
 ):
-    """Get transactions for organization (admin only)"""
+    """Bulk import historical donations from an NDJSON or CSV request body (admin only)"""
     if org_id != current_org:
         raise HTTPException(403, "Access denied")
     
-    # Query the donations collection with the correct field name
-    # Exclude the MongoDB _id field to avoid serialization issues
-    transactions = await db["donations"].find(
-        {"organization_id": org_id}, 
-        {"_id": 0}  # Exclude the _id field
-    ).sort("created_at", -1).to_list(100)
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(400, "format must be ndjson or csv")
     
-    return transactions
+    # The body is parsed as it streams in, so memory doesn't grow with the file
+    report = await import_donations(
+        donation_store, org_id, request.stream(), format,
+        chunk_size=int(os.environ.get('DONATION_IMPORT_CHUNK_SIZE', '1000')),
+        max_errors=max_errors
+    )
+    logging.info(
+        f"Imported {report.imported} donations for {org_id} "
+        f"({report.duplicates} duplicates, {report.error_count} errors, {report.rows_per_second:.0f} rows/s)"
+    )
+    return report.to_dict()
+
+@app.get("/api/static/{filename}")
+async def serve_static_asset(filename: str, request: Request):
+    """Serve a content-hashed static bundle; the name changes whenever the content does"""
+    asset = static_assets_by_hashed_name.get(filename)
+    if not asset:
+        raise HTTPException(404, "Asset not found")
+    headers = {"Cache-Control": STATIC_CACHE_CONTROL, "ETag": f'"{asset["digest"]}"'}
+    if isinstance(asset["body"], PrecompressedBody):
+        return precompressed_response(request, asset["body"], asset["media_type"], headers)
+    return Response(content=asset["body"], media_type=asset["media_type"], headers=headers)
 
 # Embed route for iframe - moved to API prefix to ensure it reaches backend
 @app.get("/api/embed/test-donate")
-async def serve_test_donation_embed(org_id: Optional[str] = None):
+async def serve_test_donation_embed(request: Request = None, org_id: Optional[str] = None):
     """Serve test donation form for iframe embedding - works without OAuth2 setup"""
     public_key = os.environ.get('BB_PUBLIC_KEY')
     
     # If org_id is provided, get organization info for mode detection
     org_test_mode = True  # Default to test mode
+    org = None
     if org_id:
-        org = await db["organizations"].find_one({"id": org_id})
+        org = await load_embed_view(org_id)
         if org:
-            org_test_mode = org.get("test_mode", True)
+            org_test_mode = org.test_mode
     
-    return HTMLResponse(f"""
+    if org:
+        etag, last_modified = org_validators("test-embed", org, public_key)
+    else:
+        etag, last_modified = compute_etag("test-embed", org_id, public_key), None
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    
+    embed_config = json_for_script({
+        "org_id": org_id or "test-org-id",
+        "api_base": EMBED_API_BASE,
+        "public_key": public_key,
+        "test_mode": org_test_mode
+    })
+    
+    html = f"""
     <!DOCTYPE html>
     <html>
     <head>
         <meta charset="utf-8">
         <meta name="viewport" content="width=device-width, initial-scale=1">
         <title>Demo Donation Form</title>
-        <script src="https://cdn.tailwindcss.com"></script>
-        <script src="https://payments.blackbaud.com/Checkout/bbCheckout.2.0.js"></script>
+        {stylesheet_tag()}
+        <link rel="preconnect" href="https://payments.blackbaud.com">
+        <link rel="dns-prefetch" href="https://payments.blackbaud.com">
         <style>
             body {{ margin: 0; padding: 20px; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', 'Roboto', sans-serif; }}
         </style>
     </head>
     <body>
         <div id="donation-root" class="max-w-md mx-auto"></div>
-        <script>
-            const API_BASE = 'https://giftflow.preview.emergentagent.com/api';
-            const BB_PUBLIC_KEY = '{public_key}';
-            const ORG_ID = '{org_id or "test-org-id"}';
-            const ORG_TEST_MODE = {str(org_test_mode).lower()};
-            
-            // Demo donation form implementation - follows organization mode
-            window.addEventListener('DOMContentLoaded', function() {{
-                renderTestDonationForm();
-            }});
-            
-            function renderTestDonationForm() {{
-                const root = document.getElementById('donation-root');
-                const modeIndicator = ORG_TEST_MODE ? 
-                    '<div class="bg-yellow-100 border border-yellow-300 text-yellow-800 px-3 py-2 rounded-md text-sm mb-4">🧪 Demo Form - Test Mode (No real charges)</div>' :
-                    '<div class="bg-green-100 border border-green-300 text-green-800 px-3 py-2 rounded-md text-sm mb-4">🚀 Demo Form - Production Mode (Live payments)</div>';
-                    
-                root.innerHTML = `
-                    <div class="bg-white rounded-lg shadow-lg p-6">
-                        <h2 class="text-2xl font-bold text-gray-800 mb-2">Demo Donation Form</h2>
-                        ${{modeIndicator}}
-                        <p class="text-gray-600 mb-6">This is a test donation form demonstrating the Blackbaud Checkout integration.</p>
-                        
-                        <form id="donation-form" class="space-y-4">
-                            <div>
-                                <label class="block text-sm font-medium text-gray-700 mb-2">Donation Amount</label>
-                                <div class="grid grid-cols-3 gap-2 mb-3">
-                                    <button type="button" class="amount-btn bg-gray-100 hover:bg-blue-100 border border-gray-300 rounded px-3 py-2 text-sm font-medium" data-amount="25">
-                                        $25
-                                    </button>
-                                    <button type="button" class="amount-btn bg-gray-100 hover:bg-blue-100 border border-gray-300 rounded px-3 py-2 text-sm font-medium" data-amount="50">
-                                        $50
-                                    </button>
-                                    <button type="button" class="amount-btn bg-gray-100 hover:bg-blue-100 border border-gray-300 rounded px-3 py-2 text-sm font-medium" data-amount="100">
-                                        $100
-                                    </button>
-                                </div>
-                                <div class="flex items-center space-x-2">
-                                    <button type="button" id="custom-btn" class="amount-btn bg-gray-100 hover:bg-blue-100 border border-gray-300 rounded px-3 py-2 text-sm font-medium">
-                                        Custom
-                                    </button>
-                                    <input type="number" id="custom-amount" class="hidden flex-1 border border-gray-300 rounded px-3 py-2 text-sm" placeholder="Enter amount" min="1" step="0.01">
-                                </div>
-                            </div>
-                            
-                            <div>
-                                <label class="block text-sm font-medium text-gray-700 mb-1">Full Name</label>
-                                <input type="text" id="donor-name" required class="w-full border border-gray-300 rounded px-3 py-2 text-sm focus:outline-none focus:ring-2 focus:ring-blue-500" value="Test Donor" placeholder="Enter your full name">
-                            </div>
-                            
-                            <div>
-                                <label class="block text-sm font-medium text-gray-700 mb-1">Email Address</label>
-                                <input type="email" id="donor-email" required class="w-full border border-gray-300 rounded px-3 py-2 text-sm focus:outline-none focus:ring-2 focus:ring-blue-500" value="test@example.com" placeholder="Enter your email">
-                            </div>
-                            
-                            <button type="submit" id="donate-btn" class="w-full bg-blue-600 text-white font-medium py-3 px-4 rounded hover:bg-blue-700 disabled:bg-gray-400 disabled:cursor-not-allowed">
-                                Donate Now (Test Mode)
-                            </button>
-                        </form>
-                        
-                        <div id="loading" class="hidden text-center py-8">
-                            <div class="inline-block animate-spin rounded-full h-8 w-8 border-b-2 border-blue-600"></div>
-                            <p class="mt-2 text-gray-600">Processing your test donation...</p>
-                        </div>
-                        
-                        <div id="success" class="hidden text-center py-8">
-                            <div class="text-green-600 text-4xl mb-4">✓</div>
-                            <h3 class="text-lg font-medium text-gray-800">Test donation successful!</h3>
-                            <p class="text-gray-600 mt-2">This demonstrates the complete payment flow integration.</p>
-                        </div>
-                    </div>
-                `;
-                
-                setupTestFormInteractions();
-            }}
-            
-            function setupTestFormInteractions() {{
-                let selectedAmount = 25; // Default to $25
-                
-                // Pre-select the $25 button
-                const firstBtn = document.querySelector('[data-amount="25"]');
-                if (firstBtn) {{
-                    firstBtn.classList.add('bg-blue-500', 'text-white');
-                }}
-                
-                // Amount button handlers
-                document.querySelectorAll('.amount-btn').forEach(btn => {{
-                    btn.addEventListener('click', function() {{
-                        document.querySelectorAll('.amount-btn').forEach(b => b.classList.remove('bg-blue-500', 'text-white'));
-                        this.classList.add('bg-blue-500', 'text-white');
-                        
-                        if (this.id === 'custom-btn') {{
-                            document.getElementById('custom-amount').classList.remove('hidden');
-                            selectedAmount = null;
-                        }} else {{
-                            document.getElementById('custom-amount').classList.add('hidden');
-                            selectedAmount = parseFloat(this.dataset.amount);
-                        }}
-                        updateDonateButton();
-                    }});
-                }});
-                
-                // Custom amount input
-                const customAmountInput = document.getElementById('custom-amount');
-                if (customAmountInput) {{
-                    customAmountInput.addEventListener('input', function() {{
-                        selectedAmount = parseFloat(this.value);
-                        updateDonateButton();
-                    }});
-                }}
-                
-                // Form fields
-                document.getElementById('donor-name').addEventListener('input', updateDonateButton);
-                document.getElementById('donor-email').addEventListener('input', updateDonateButton);
-                
-                // Form submission
-                document.getElementById('donation-form').addEventListener('submit', handleTestDonationSubmit);
-                
-                // Enable button initially
-                updateDonateButton();
-                
-                function updateDonateButton() {{
-                    const name = document.getElementById('donor-name').value.trim();
-                    const email = document.getElementById('donor-email').value.trim();
-                    const donateBtn = document.getElementById('donate-btn');
-                    
-                    const isValid = selectedAmount > 0 && name && email && email.includes('@');
-                    donateBtn.disabled = !isValid;
-                }}
-                
-                async function handleTestDonationSubmit(e) {{
-                    e.preventDefault();
-                    
-                    const donationData = {{
-                        amount: selectedAmount,
-                        donor_name: document.getElementById('donor-name').value.trim(),
-                        donor_email: document.getElementById('donor-email').value.trim(),
-                        org_id: ORG_ID  // Use the organization ID passed from URL
-                    }};
-                    
-                    console.log('Starting test donation process with data:', donationData);
-                    
-                    // Show loading
-                    document.getElementById('donation-form').classList.add('hidden');
-                    document.getElementById('loading').classList.remove('hidden');
-                    
-                    try {{
-                        console.log('Step 1: Getting test checkout configuration from backend...');
-                        
-                        // Step 1: Get test checkout configuration
-                        const configResponse = await fetch(`${{API_BASE}}/test-donate`, {{
-                            method: 'POST',
-                            headers: {{
-                                'Content-Type': 'application/json'
-                            }},
-                            body: JSON.stringify(donationData)
-                        }});
-                        
-                        console.log('Config response status:', configResponse.status);
-                        
-                        if (!configResponse.ok) {{
-                            const errorText = await configResponse.text();
-                            console.error('Config response error:', errorText);
-                            throw new Error(`Failed to get checkout configuration: ${{configResponse.status}} - ${{errorText}}`);
-                        }}
-                        
-                        const configResult = await configResponse.json();
-                        console.log('Config result:', configResult);
-                        const checkoutConfig = configResult.checkout_config;
-                        
-                        if (!checkoutConfig) {{
-                            throw new Error('No checkout configuration received from server');
-                        }}
-                        
-                        console.log('Step 2: Testing Blackbaud Checkout SDK integration...');
-                        console.log('Blackbaud_OpenPaymentForm available:', typeof Blackbaud_OpenPaymentForm);
-                        
-                        // Check for the correct Blackbaud function
-                        if (typeof Blackbaud_OpenPaymentForm === 'undefined') {{
-                            console.error('Blackbaud_OpenPaymentForm function not found. Available functions:', Object.keys(window).filter(key => key.toLowerCase().includes('blackbaud')));
-                            throw new Error('Blackbaud Checkout SDK not loaded properly');
-                        }}
-                        
-                        console.log('Step 3: Setting up Blackbaud checkout event listeners...');
-                        
-                        // Set up event listeners for checkout events
-                        document.addEventListener('checkoutReady', function() {{
-                            console.log('Checkout ready');
-                        }});
-                        
-                        document.addEventListener('checkoutLoaded', function() {{
-                            console.log('Checkout loaded');
-                        }});
-                        
-                        document.addEventListener('checkoutCancel', function() {{
-                            console.log('REAL payment cancelled');
-                            handlePaymentCancel();
-                        }});
-                        
-                        document.addEventListener('checkoutComplete', function(e) {{
-                            console.log('REAL payment complete, transaction token:', e.detail.transactionToken);
-                            handleTestPaymentSuccess(e.detail.transactionToken, donationData);
-                        }});
-                        
-                        document.addEventListener('checkoutError', function(e) {{
-                            console.error('REAL payment error:', e.detail);
-                            handlePaymentError({{
-                                message: e.detail.errorText,
-                                code: e.detail.errorCode
-                            }});
-                        }});
-                        
-                        console.log('Step 4: Creating transaction object...');
-                        console.log('Checkout config received:', checkoutConfig);
-                        console.log('Mode settings - test_mode:', checkoutConfig.test_mode, 'process_mode:', checkoutConfig.process_mode);
-                        
-                        // Create transaction object as per official documentation
-                        const transactionData = {{
-                            key: BB_PUBLIC_KEY, // Using the public key as the transaction key
-                            payment_configuration_id: checkoutConfig.merchant_account_id,
-                            Amount: checkoutConfig.amount,
-                            process_mode: checkoutConfig.process_mode || 'test'  // Critical: Controls test vs production mode
-                        }};
-                        
-                        console.log('Transaction data:', transactionData);
-                        
-                        console.log('Step 5: Opening REAL Blackbaud checkout modal...');
-                        
-                        // Open the REAL checkout modal using official Blackbaud method
-                        Blackbaud_OpenPaymentForm(transactionData);
-                        
-                    }} catch (error) {{
-                        console.error('Test donation initialization failed:', error);
-                        alert(`Failed to initialize test payment: ${{error.message}}`);
-                        
-                        // Show form again
-                        document.getElementById('loading').classList.add('hidden');
-                        document.getElementById('donation-form').classList.remove('hidden');
-                    }}
-                }}
-                
-                async function handleTestPaymentSuccess(transactionToken, donationData) {{
-                    try {{
-                        console.log('Processing test transaction token:', transactionToken);
-                        
-                        // Process the REAL transaction token
-                        const response = await fetch(`${{API_BASE}}/test-process-transaction`, {{
-                            method: 'POST',
-                            headers: {{
-                                'Content-Type': 'application/json'
-                            }},
-                            body: JSON.stringify({{
-                                transaction_token: transactionToken,
-                                donation_data: donationData
-                            }})
-                        }});
-                        
-                        if (!response.ok) {{
-                            throw new Error('Failed to process transaction');
-                        }}
-                        
-                        const result = await response.json();
-                        console.log('REAL donation completed successfully:', result);
-                        
-                        // Show success message
-                        document.getElementById('loading').classList.add('hidden');
-                        document.getElementById('success').classList.remove('hidden');
-                        
-                    }} catch (error) {{
-                        console.error('REAL transaction processing failed:', error);
-                        alert('Payment was processed but we had trouble recording it. Please contact support.');
-                    }}
-                }}
-                
-                function handlePaymentCancel() {{
-                    console.log('REAL payment was cancelled by user');
-                    // Show form again
-                    document.getElementById('loading').classList.add('hidden');
-                    document.getElementById('donation-form').classList.remove('hidden');
-                }}
-                
-                function handlePaymentError(error) {{
-                    console.error('REAL payment error:', error);
-                    alert(`Payment failed: ${{error.message || 'Unknown error'}}`);
-                    // Show form again
-                    document.getElementById('loading').classList.add('hidden');
-                    document.getElementById('donation-form').classList.remove('hidden');
-                }}
-            }}
-        </script>
+        <script id="embed-config" type="application/json">{embed_config}</script>
+        <script src="{static_url('checkout-loader.js')}"></script>
+        <script src="{static_url('test-donation-form.js')}"></script>
     </body>
     </html>
-    """)
-@app.get("/api/embed/donate/{org_id}")
-async def serve_donation_embed(org_id: str):
-    """Serve donation form for iframe embedding with Blackbaud JavaScript SDK"""
-    try:
-        # Check if organization exists and has BBMS configured
-        org = await db["organizations"].find_one({"id": org_id})
-        if not org:
-            # Fallback to test form if organization not found
-            return await serve_test_donation_embed()
-        
-        bbms_config = org.get("bbms_config", {})
-        # Check both new and legacy formats for access token
-        has_access_token = bool(org.get("bb_access_token")) or bool(bbms_config.get("access_token"))
-        if not has_access_token:
-            # Fallback to test form if not configured
-            return await serve_test_donation_embed()
-        
-        # Organization is properly configured, show the real form
-        public_key = os.environ.get('BB_PUBLIC_KEY')
-        org_test_mode = org.get("test_mode", True)
-        
-        return HTMLResponse(f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1">
-            <title>Donation Form</title>
-            <script src="https://cdn.tailwindcss.com"></script>
-            <script src="https://payments.blackbaud.com/Checkout/bbCheckout.2.0.js"></script>
-            <style>
-                body {{ margin: 0; padding: 20px; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', 'Roboto', sans-serif; }}
-            </style>
-        </head>
-        <body>
-            <div id="donation-root" class="max-w-md mx-auto"></div>
-            <script>
-                const ORG_ID = '{org_id}';
-                const API_BASE = 'https://giftflow.preview.emergentagent.com/api';
-                const BB_PUBLIC_KEY = '{public_key}';
-                const ORG_TEST_MODE = {str(org_test_mode).lower()};  // Organization's test mode setting
-                
-                // Organization-specific donation form implementation
-                window.addEventListener('DOMContentLoaded', function() {{
-                    initDonationForm();
-                }});
-                
-                async function initDonationForm() {{
-                    try {{
-                        const response = await fetch(`${{API_BASE}}/organizations/${{ORG_ID}}/donation-form`);
-                        const config = await response.json();
-                        renderDonationForm(config);
-                    }} catch (error) {{
-                        console.error('Failed to load form config:', error);
-                        document.getElementById('donation-root').innerHTML = '<p class="text-red-500">Failed to load donation form</p>';
-                    }}
-                }}
-                
-                function renderDonationForm(config) {{
-                    const root = document.getElementById('donation-root');
-                    const modeIndicator = ORG_TEST_MODE ? 
-                        '<div class="bg-yellow-100 border border-yellow-300 text-yellow-800 px-3 py-2 rounded-md text-sm mb-4">🧪 Test Mode - No real charges will be made</div>' :
-                        '<div class="bg-green-100 border border-green-300 text-green-800 px-3 py-2 rounded-md text-sm mb-4">🚀 Production Mode - Live payments</div>';
-                        
-                    root.innerHTML = `
-                        <div class="bg-white rounded-lg shadow-lg p-6">
-                            <h2 class="text-2xl font-bold text-gray-800 mb-2">${{config.organization_name}}</h2>
-                            ${{modeIndicator}}
-                            <p class="text-gray-600 mb-6">${{config.description}}</p>
-                            
-                            <form id="donation-form" class="space-y-4">
-                                <div>
-                                    <label class="block text-sm font-medium text-gray-700 mb-2">Donation Amount</label>
-                                    <div class="grid grid-cols-3 gap-2 mb-3">
-                                        ${{config.preset_amounts.map(amount => `
-                                            <button type="button" class="amount-btn bg-gray-100 hover:bg-blue-100 border border-gray-300 rounded px-3 py-2 text-sm font-medium" data-amount="${{amount}}">
-                                                $${{amount}}
-                                            </button>
-                                        `).join('')}}
-                                    </div>
-                                    ${{config.custom_amount_enabled ? `
-                                        <div class="flex items-center space-x-2">
-                                            <button type="button" id="custom-btn" class="amount-btn bg-gray-100 hover:bg-blue-100 border border-gray-300 rounded px-3 py-2 text-sm font-medium">
-                                                Custom
-                                            </button>
-                                            <input type="number" id="custom-amount" class="hidden flex-1 border border-gray-300 rounded px-3 py-2 text-sm" placeholder="Enter amount" min="1" step="0.01">
-                                        </div>
-                                    ` : ''}}
-                                </div>
-                                
-                                <div>
-                                    <label class="block text-sm font-medium text-gray-700 mb-1">Full Name</label>
-                                    <input type="text" id="donor-name" required class="w-full border border-gray-300 rounded px-3 py-2 text-sm focus:outline-none focus:ring-2 focus:ring-blue-500">
-                                </div>
-                                
-                                <div>
-                                    <label class="block text-sm font-medium text-gray-700 mb-1">Email Address</label>
-                                    <input type="email" id="donor-email" required class="w-full border border-gray-300 rounded px-3 py-2 text-sm focus:outline-none focus:ring-2 focus:ring-blue-500">
-                                </div>
-                                
-                                <button type="submit" id="donate-btn" disabled class="w-full bg-blue-600 text-white font-medium py-3 px-4 rounded hover:bg-blue-700 disabled:bg-gray-400 disabled:cursor-not-allowed">
-                                    Donate Now
-                                </button>
-                            </form>
-                            
-                            <div id="loading" class="hidden text-center py-8">
-                                <div class="inline-block animate-spin rounded-full h-8 w-8 border-b-2 border-blue-600"></div>
-                                <p class="mt-2 text-gray-600">Processing your donation...</p>
-                            </div>
-                            
-                            <div id="success" class="hidden text-center py-8">
-                                <div class="text-green-600 text-4xl mb-4">✓</div>
-                                <h3 class="text-lg font-medium text-gray-800">Thank you for your donation!</h3>
-                                <p class="text-gray-600 mt-2">Your payment has been processed successfully.</p>
-                            </div>
-                        </div>
-                    `;
-                    
-                    setupFormInteractions();
-                }}
-                
-                function setupFormInteractions() {{
-                    let selectedAmount = null;
-                    
-                    // Amount button handlers
-                    document.querySelectorAll('.amount-btn').forEach(btn => {{
-                        btn.addEventListener('click', function() {{
-                            document.querySelectorAll('.amount-btn').forEach(b => b.classList.remove('bg-blue-500', 'text-white'));
-                            this.classList.add('bg-blue-500', 'text-white');
-                            
-                            if (this.id === 'custom-btn') {{
-                                document.getElementById('custom-amount').classList.remove('hidden');
-                                selectedAmount = null;
-                            }} else {{
-                                document.getElementById('custom-amount').classList.add('hidden');
-                                selectedAmount = parseFloat(this.dataset.amount);
-                            }}
-                            updateDonateButton();
-                        }});
-                    }});
-                    
-                    // Custom amount input
-                    const customAmountInput = document.getElementById('custom-amount');
-                    if (customAmountInput) {{
-                        customAmountInput.addEventListener('input', function() {{
-                            selectedAmount = parseFloat(this.value);
-                            updateDonateButton();
-                        }});
-                    }}
-                    
-                    // Form fields
-                    document.getElementById('donor-name').addEventListener('input', updateDonateButton);
-                    document.getElementById('donor-email').addEventListener('input', updateDonateButton);
-                    
-                    // Form submission
-                    document.getElementById('donation-form').addEventListener('submit', handleDonationSubmit);
-                    
-                    function updateDonateButton() {{
-                        const name = document.getElementById('donor-name').value.trim();
-                        const email = document.getElementById('donor-email').value.trim();
-                        const donateBtn = document.getElementById('donate-btn');
-                        
-                        const isValid = selectedAmount > 0 && name && email && email.includes('@');
-                        donateBtn.disabled = !isValid;
-                    }}
-                    
-                    async function handleDonationSubmit(e) {{
-                        e.preventDefault();
-                        
-                        const donationData = {{
-                            amount: selectedAmount,
-                            donor_name: document.getElementById('donor-name').value.trim(),
-                            donor_email: document.getElementById('donor-email').value.trim(),
-                            org_id: ORG_ID
-                        }};
-                        
-                        console.log('Starting donation process with data:', donationData);
-                        
-                        // Show loading
-                        document.getElementById('donation-form').classList.add('hidden');
-                        document.getElementById('loading').classList.remove('hidden');
-                        
-                        try {{
-                            console.log('Step 1: Getting checkout configuration from backend...');
-                            
-                            // Step 1: Get checkout configuration from our backend
-                            const configResponse = await fetch(`${{API_BASE}}/donate`, {{
-                                method: 'POST',
-                                headers: {{
-                                    'Content-Type': 'application/json'
-                                }},
-                                body: JSON.stringify(donationData)
-                            }});
-                            
-                            console.log('Config response status:', configResponse.status);
-                            
-                            if (!configResponse.ok) {{
-                                const errorText = await configResponse.text();
-                                console.error('Config response error:', errorText);
-                                throw new Error(`Failed to get checkout configuration: ${{configResponse.status}} - ${{errorText}}`);
-                            }}
-                            
-                            const configResult = await configResponse.json();
-                            console.log('Config result:', configResult);
-                            const checkoutConfig = configResult.checkout_config;
-                            
-                            if (!checkoutConfig) {{
-                                throw new Error('No checkout configuration received from server');
-                            }}
-                            
-                            console.log('Step 2: Testing Blackbaud Checkout SDK integration...');
-                            console.log('Blackbaud_OpenPaymentForm available:', typeof Blackbaud_OpenPaymentForm);
-                            
-                            // Check for the correct Blackbaud function
-                            if (typeof Blackbaud_OpenPaymentForm === 'undefined') {{
-                                console.error('Blackbaud_OpenPaymentForm function not found. Available functions:', Object.keys(window).filter(key => key.toLowerCase().includes('blackbaud')));
-                                throw new Error('Blackbaud Checkout SDK not loaded properly');
-                            }}
-                            
-                            console.log('Step 3: Setting up Blackbaud checkout event listeners...');
-                            
-                            // Set up event listeners for checkout events
-                            document.addEventListener('checkoutReady', function() {{
-                                console.log('Checkout ready');
-                            }});
-                            
-                            document.addEventListener('checkoutLoaded', function() {{
-                                console.log('Checkout loaded');
-                            }});
-                            
-                            document.addEventListener('checkoutCancel', function() {{
-                                console.log('REAL payment cancelled');
-                                handlePaymentCancel();
-                            }});
-                            
-                            document.addEventListener('checkoutComplete', function(e) {{
-                                console.log('REAL payment complete, transaction token:', e.detail.transactionToken);
-                                handlePaymentSuccess(e.detail.transactionToken, donationData);
-                            }});
-                            
-                            document.addEventListener('checkoutError', function(e) {{
-                                console.error('REAL payment error:', e.detail);
-                                handlePaymentError({{
-                                    message: e.detail.errorText,
-                                    code: e.detail.errorCode
-                                }});
-                            }});
-                            
-                            console.log('Step 4: Creating transaction object...');
-                            console.log('Checkout config received:', checkoutConfig);
-                            console.log('Mode settings - test_mode:', checkoutConfig.test_mode, 'process_mode:', checkoutConfig.process_mode);
-                            
-                            // Create transaction object as per official documentation
-                            const transactionData = {{
-                                key: BB_PUBLIC_KEY, // Using the public key as the transaction key
-                                payment_configuration_id: checkoutConfig.merchant_account_id,
-                                Amount: checkoutConfig.amount,
-                                process_mode: checkoutConfig.process_mode || 'test'  // Critical: Controls test vs production mode
-                            }};
-                            
-                            console.log('Transaction data:', transactionData);
-                            
-                            console.log('Step 5: Opening REAL Blackbaud checkout modal...');
-                            
-                            // Open the REAL checkout modal using official Blackbaud method
-                            Blackbaud_OpenPaymentForm(transactionData);
-                            
-                        }} catch (error) {{
-                            console.error('Donation initialization failed:', error);
-                            alert(`Failed to initialize payment: ${{error.message}}`);
-                            
-                            // Show form again
-                            document.getElementById('loading').classList.add('hidden');
-                            document.getElementById('donation-form').classList.remove('hidden');
-                        }}
-                    }}
-                    
-                    async function handlePaymentSuccess(transactionToken, donationData) {{
-                        try {{
-                            console.log('Processing REAL transaction token:', transactionToken);
-                            
-                            // Process the REAL transaction token
-                            const response = await fetch(`${{API_BASE}}/process-transaction`, {{
-                                method: 'POST',
-                                headers: {{
-                                    'Content-Type': 'application/json'
-                                }},
-                                body: JSON.stringify({{
-                                    transaction_token: transactionToken,
-                                    donation_data: donationData
-                                }})
-                            }});
-                            
-                            if (!response.ok) {{
-                                throw new Error('Failed to process transaction');
-                            }}
-                            
-                            const result = await response.json();
-                            console.log('REAL donation completed successfully:', result);
-                            
-                            // Show success message
-                            document.getElementById('loading').classList.add('hidden');
-                            document.getElementById('success').classList.remove('hidden');
-                            
-                        }} catch (error) {{
-                            console.error('REAL transaction processing failed:', error);
-                            alert('Payment was processed but we had trouble recording it. Please contact support.');
-                        }}
-                    }}
-                    
-                    function handlePaymentCancel() {{
-                        console.log('REAL payment was cancelled by user');
-                        // Show form again
-                        document.getElementById('loading').classList.add('hidden');
-                        document.getElementById('donation-form').classList.remove('hidden');
-                    }}
-                    
-                    function handlePaymentError(error) {{
-                        console.error('REAL payment error:', error);
-                        alert(`Payment failed: ${{error.message || 'Unknown error'}}`);
-                        // Show form again
-                        document.getElementById('loading').classList.add('hidden');
-                        document.getElementById('donation-form').classList.remove('hidden');
-                    }}
-                }}
-            </script>
-        </body>
-        </html>
-        """)
-        
-    except Exception as e:
-        logging.error(f"Error serving donation embed: {str(e)}")
-        # Fallback to test form on any error
-        return await serve_test_donation_embed()
-    return HTMLResponse(f"""
+    """
+    return HTMLResponse(html, headers=validator_headers(etag, last_modified))
+
+
+def donation_embed_validators(org: OrgSnapshot) -> tuple:
+    return org_validators("embed", org, os.environ.get('BB_PUBLIC_KEY'), EMBED_INLINE_FORM_CONFIG)
+
+def render_donation_embed(org: OrgSnapshot) -> str:
+    """Render the embed page for a configured organization"""
+    org_id = org.id
+    public_key = os.environ.get('BB_PUBLIC_KEY')
+    org_test_mode = org.test_mode
+    
+    # Ship the form config with the page so the iframe can render without
+    # a second request; the client falls back to fetching it when absent
+    form_config_island = ""
+    if EMBED_INLINE_FORM_CONFIG:
+        form_config = build_donation_form_config(org)
+        form_config_island = f'<script id="donation-form-config" type="application/json">{json_for_script(form_config)}</script>'
+    
+    embed_config = json_for_script({
+        "org_id": org_id,
+        "api_base": EMBED_API_BASE,
+        "public_key": public_key,
+        "test_mode": org_test_mode
+    })
+    
+    return f"""
     <!DOCTYPE html>
     <html>
     <head>
         <meta charset="utf-8">
         <meta name="viewport" content="width=device-width, initial-scale=1">
         <title>Donation Form</title>
-        <script src="https://cdn.tailwindcss.com"></script>
-        <script src="https://payments.blackbaud.com/Checkout/bbCheckout.2.0.js"></script>
+        {stylesheet_tag()}
+        <link rel="preconnect" href="https://payments.blackbaud.com">
+        <link rel="dns-prefetch" href="https://payments.blackbaud.com">
         <style>
             body {{ margin: 0; padding: 20px; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', 'Roboto', sans-serif; }}
         </style>
     </head>
     <body>
         <div id="donation-root" class="max-w-md mx-auto"></div>
-        <script>
-            const ORG_ID = '{org_id}';
-            const API_BASE = 'https://giftflow.preview.emergentagent.com/api';
-            const BB_PUBLIC_KEY = '{public_key}';
-            
-            // Simple donation form implementation with Blackbaud Checkout
-            window.addEventListener('DOMContentLoaded', function() {{
-                initDonationForm();
-            }});
-            
-            async function initDonationForm() {{
-                try {{
-                    const response = await fetch(`${{API_BASE}}/organizations/${{ORG_ID}}/donation-form`);
-                    const config = await response.json();
-                    renderDonationForm(config);
-                }} catch (error) {{
-                    console.error('Failed to load form config:', error);
-                    document.getElementById('donation-root').innerHTML = '<p class="text-red-500">Failed to load donation form</p>';
-                }}
-            }}
-            
-            function renderDonationForm(config) {{
-                const root = document.getElementById('donation-root');
-                root.innerHTML = `
-                    <div class="bg-white rounded-lg shadow-lg p-6">
-                        <h2 class="text-2xl font-bold text-gray-800 mb-2">${{config.organization_name}}</h2>
-                        <p class="text-gray-600 mb-6">${{config.description}}</p>
-                        
-                        <form id="donation-form" class="space-y-4">
-                            <div>
-                                <label class="block text-sm font-medium text-gray-700 mb-2">Donation Amount</label>
-                                <div class="grid grid-cols-3 gap-2 mb-3">
-                                    ${{config.preset_amounts.map(amount => `
-                                        <button type="button" class="amount-btn bg-gray-100 hover:bg-blue-100 border border-gray-300 rounded px-3 py-2 text-sm font-medium" data-amount="${{amount}}">
-                                            $${{amount}}
-                                        </button>
-                                    `).join('')}}
-                                </div>
-                                ${{config.custom_amount_enabled ? `
-                                    <div class="flex items-center space-x-2">
-                                        <button type="button" id="custom-btn" class="amount-btn bg-gray-100 hover:bg-blue-100 border border-gray-300 rounded px-3 py-2 text-sm font-medium">
-                                            Custom
-                                        </button>
-                                        <input type="number" id="custom-amount" class="hidden flex-1 border border-gray-300 rounded px-3 py-2 text-sm" placeholder="Enter amount" min="1" step="0.01">
-                                    </div>
-                                ` : ''}}
-                            </div>
-                            
-                            <div>
-                                <label class="block text-sm font-medium text-gray-700 mb-1">Full Name</label>
-                                <input type="text" id="donor-name" required class="w-full border border-gray-300 rounded px-3 py-2 text-sm focus:outline-none focus:ring-2 focus:ring-blue-500">
-                            </div>
-                            
-                            <div>
-                                <label class="block text-sm font-medium text-gray-700 mb-1">Email Address</label>
-                                <input type="email" id="donor-email" required class="w-full border border-gray-300 rounded px-3 py-2 text-sm focus:outline-none focus:ring-2 focus:ring-blue-500">
-                            </div>
-                            
-                            <button type="submit" id="donate-btn" disabled class="w-full bg-blue-600 text-white font-medium py-3 px-4 rounded hover:bg-blue-700 disabled:bg-gray-400 disabled:cursor-not-allowed">
-                                Donate Now
-                            </button>
-                        </form>
-                        
-                        <div id="loading" class="hidden text-center py-8">
-                            <div class="inline-block animate-spin rounded-full h-8 w-8 border-b-2 border-blue-600"></div>
-                            <p class="mt-2 text-gray-600">Processing your donation...</p>
-                        </div>
-                        
-                        <div id="success" class="hidden text-center py-8">
-                            <div class="text-green-600 text-4xl mb-4">✓</div>
-                            <h3 class="text-lg font-medium text-gray-800">Thank you for your donation!</h3>
-                            <p class="text-gray-600 mt-2">Your payment has been processed successfully.</p>
-                        </div>
-                    </div>
-                `;
-                
-                setupFormInteractions();
-            }}
-            
-            function setupFormInteractions() {{
-                let selectedAmount = null;
-                
-                // Amount button handlers
-                document.querySelectorAll('.amount-btn').forEach(btn => {{
-                    btn.addEventListener('click', function() {{
-                        document.querySelectorAll('.amount-btn').forEach(b => b.classList.remove('bg-blue-500', 'text-white'));
-                        this.classList.add('bg-blue-500', 'text-white');
-                        
-                        if (this.id === 'custom-btn') {{
-                            document.getElementById('custom-amount').classList.remove('hidden');
-                            selectedAmount = null;
-                        }} else {{
-                            document.getElementById('custom-amount').classList.add('hidden');
-                            selectedAmount = parseFloat(this.dataset.amount);
-                        }}
-                        updateDonateButton();
-                    }});
-                }});
-                
-                // Custom amount input
-                const customAmountInput = document.getElementById('custom-amount');
-                if (customAmountInput) {{
-                    customAmountInput.addEventListener('input', function() {{
-                        selectedAmount = parseFloat(this.value);
-                        updateDonateButton();
-                    }});
-                }}
-                
-                // Form fields
-                document.getElementById('donor-name').addEventListener('input', updateDonateButton);
-                document.getElementById('donor-email').addEventListener('input', updateDonateButton);
-                
-                // Form submission
-                document.getElementById('donation-form').addEventListener('submit', handleDonationSubmit);
-                
-                function updateDonateButton() {{
-                    const name = document.getElementById('donor-name').value.trim();
-                    const email = document.getElementById('donor-email').value.trim();
-                    const donateBtn = document.getElementById('donate-btn');
-                    
-                    const isValid = selectedAmount > 0 && name && email && email.includes('@');
-                    donateBtn.disabled = !isValid;
-                }}
-                
-                async function handleDonationSubmit(e) {{
-                    e.preventDefault();
-                    
-                    const donationData = {{
-                        amount: selectedAmount,
-                        donor_name: document.getElementById('donor-name').value.trim(),
-                        donor_email: document.getElementById('donor-email').value.trim(),
-                        org_id: ORG_ID
-                    }};
-                    
-                    console.log('Starting donation process with data:', donationData);
-                    
-                    // Show loading
-                    document.getElementById('donation-form').classList.add('hidden');
-                    document.getElementById('loading').classList.remove('hidden');
-                    
-                    try {{
-                        console.log('Step 1: Getting checkout configuration from backend...');
-                        
-                        // Step 1: Get checkout configuration from our backend
-                        const configResponse = await fetch(`${{API_BASE}}/donate`, {{
-                            method: 'POST',
-                            headers: {{
-                                'Content-Type': 'application/json'
-                            }},
-                            body: JSON.stringify(donationData)
-                        }});
-                        
-                        console.log('Config response status:', configResponse.status);
-                        
-                        if (!configResponse.ok) {{
-                            const errorText = await configResponse.text();
-                            console.error('Config response error:', errorText);
-                            throw new Error(`Failed to get checkout configuration: ${{configResponse.status}} - ${{errorText}}`);
-                        }}
-                        
-                        const configResult = await configResponse.json();
-                        console.log('Config result:', configResult);
-                        const checkoutConfig = configResult.checkout_config;
-                        
-                        if (!checkoutConfig) {{
-                            throw new Error('No checkout configuration received from server');
-                        }}
-                        
-                        console.log('Step 2: Checking for Blackbaud Checkout SDK...');
-                        console.log('bbCheckout available:', typeof bbCheckout);
-                        console.log('window.bbCheckout available:', typeof window.bbCheckout);
-                        
-                        // Step 2: Check multiple possible SDK variable names
-                        let CheckoutSDK = null;
-                        if (typeof bbCheckout !== 'undefined') {{
-                            CheckoutSDK = bbCheckout;
-                            console.log('Using bbCheckout');
-                        }} else if (typeof window.bbCheckout !== 'undefined') {{
-                            CheckoutSDK = window.bbCheckout;
-                            console.log('Using window.bbCheckout');
-                        }} else if (typeof window.BlackbaudCheckout !== 'undefined') {{
-                            CheckoutSDK = window.BlackbaudCheckout;
-                            console.log('Using window.BlackbaudCheckout');
-                        }} else {{
-                            console.error('Blackbaud Checkout SDK not found. Available objects:', Object.keys(window));
-                            throw new Error('Blackbaud Checkout SDK not loaded');
-                        }}
-                        
-                        console.log('Step 3: Initializing checkout with config:', {{
-                            publicKey: BB_PUBLIC_KEY,
-                            merchantAccountId: checkoutConfig.merchant_account_id,
-                            amount: Math.round(checkoutConfig.amount * 100),
-                            currency: 'USD'
-                        }});
-                        
-                        // Step 3: Initialize Blackbaud Checkout with JavaScript SDK
-                        const checkout = new CheckoutSDK({{
-                            publicKey: BB_PUBLIC_KEY,
-                            merchantAccountId: checkoutConfig.merchant_account_id,
-                            amount: Math.round(checkoutConfig.amount * 100), // Convert to cents
-                            currency: 'USD',
-                            customer: {{
-                                email: checkoutConfig.donor_info.email,
-                                name: checkoutConfig.donor_info.name
-                            }},
-                            onSuccess: function(transactionToken) {{
-                                console.log('Payment success, token:', transactionToken);
-                                handlePaymentSuccess(transactionToken, donationData);
-                            }},
-                            onCancel: function() {{
-                                console.log('Payment cancelled');
-                                handlePaymentCancel();
-                            }},
-                            onError: function(error) {{
-                                console.error('Payment error:', error);
-                                handlePaymentError(error);
-                            }}
-                        }});
-                        
-                        console.log('Step 4: Opening checkout modal...');
-                        // Open the checkout modal
-                        checkout.open();
-                        
-                    }} catch (error) {{
-                        console.error('Donation initialization failed:', error);
-                        alert(`Failed to initialize payment: ${{error.message}}`);
-                        
-                        // Show form again
-                        document.getElementById('loading').classList.add('hidden');
-                        document.getElementById('donation-form').classList.remove('hidden');
-                    }}
-                }}
-                
-                async function handlePaymentSuccess(transactionToken, donationData) {{
-                    try {{
-                        // Process the transaction token with our backend
-                        const response = await fetch(`${{API_BASE}}/process-transaction`, {{
-                            method: 'POST',
-                            headers: {{
-                                'Content-Type': 'application/json'
-                            }},
-                            body: JSON.stringify({{
-                                transaction_token: transactionToken,
-                                donation_data: donationData
-                            }})
-                        }});
-                        
-                        if (!response.ok) {{
-                            throw new Error('Failed to process transaction');
-                        }}
-                        
-                        const result = await response.json();
-                        
-                        // Show success message
-                        document.getElementById('loading').classList.add('hidden');
-                        document.getElementById('success').classList.remove('hidden');
-                        
-                        console.log('Donation completed successfully:', result);
-                        
-                    }} catch (error) {{
-                        console.error('Transaction processing failed:', error);
-                        alert('Payment was processed but we had trouble recording it. Please contact support.');
-                    }}
-                }}
-                
-                function handlePaymentCancel() {{
-                    console.log('Payment was cancelled by user');
-                    // Show form again
-                    document.getElementById('loading').classList.add('hidden');
-                    document.getElementById('donation-form').classList.remove('hidden');
-                }}
-                
-                function handlePaymentError(error) {{
-                    console.error('Payment error:', error);
-                    alert('Payment failed. Please try again.');
-                    // Show form again
-                    document.getElementById('loading').classList.add('hidden');
-                    document.getElementById('donation-form').classList.remove('hidden');
-                }}
-            }}
-        </script>
+        {form_config_island}
+        <script id="embed-config" type="application/json">{embed_config}</script>
+        <script src="{static_url('checkout-loader.js')}"></script>
+        <script src="{static_url('donation-form.js')}"></script>
     </body>
     </html>
-    """)
+    """
+
+@app.get("/api/embed/donate/{org_id}")
+async def serve_donation_embed(org_id: str, request: Request):
+    """Serve donation form for iframe embedding with Blackbaud JavaScript SDK"""
+    try:
+        # Check if organization exists and has BBMS configured
+        org = await load_embed_view(org_id)
+        if not org:
+            # Fallback to test form if organization not found
+            return await serve_test_donation_embed(request)
+        
+        if not org.has_bbms_access:
+            # Fallback to test form if not configured
+            return await serve_test_donation_embed(request)
+        
+        cached = get_cached_embed_page(org)
+        if cached is not None:
+            if is_not_modified(request, cached["etag"], cached["last_modified"]):
+                return not_modified_response(cached["etag"], cached["last_modified"])
+            return cached_embed_response(request, cached)
+        
+        # Organization is properly configured, show the real form
+        etag, last_modified = donation_embed_validators(org)
+        if is_not_modified(request, etag, last_modified):
+            return not_modified_response(etag, last_modified)
+        
+        entry = store_embed_page(org, render_donation_embed(org), etag, last_modified)
+        return cached_embed_response(request, entry)
+        
+    except Exception as e:
+        logging.error(f"Error serving donation embed: {str(e)}")
+        # Fallback to test form on any error
+        return await serve_test_donation_embed(request)
+
+# Static export of embed pages. When EMBED_EXPORT_DIR is set, each configured
+# organization's embed page is written there (with a .gz sibling) together with
+# the static bundles, and nginx serves them without touching Python; see the
+# embed locations in nginx.conf. Pages are re-rendered on every organization
+# write and on startup, and can be re-exported with export_embeds.py.
+EMBED_EXPORT_DIR = os.environ.get('EMBED_EXPORT_DIR')
+EXPORTABLE_ORG_ID = re.compile(r'^[A-Za-z0-9-]+$')
+
+def embed_export_path(org_id: str) -> Path:
+    return Path(EMBED_EXPORT_DIR) / f"{org_id}.html"
+
+def write_export_file(path: Path, body: PrecompressedBody) -> None:
+    """Atomically write a file and its .gz sibling (the .gz first, for gzip_static)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for target, data in ((path.with_name(path.name + ".gz"), body.variants["gzip"]), (path, body.identity)):
+        # A temp file of our own, so concurrent exports never share an inode
+        fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, target)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+def remove_embed_export(org_id: str) -> None:
+    path = embed_export_path(org_id)
+    for target in (path, path.with_name(path.name + ".gz")):
+        target.unlink(missing_ok=True)
+
+async def export_embed_page(org_id: str) -> bool:
+    """Re-render one organization's exported page; returns False if it has none"""
+    if not EMBED_EXPORT_DIR or not EXPORTABLE_ORG_ID.match(org_id):
+        return False
+    # Remove first so nginx never serves a stale page while we re-render
+    remove_embed_export(org_id)
+    org = await load_embed_view(org_id)
+    if not org or not org.has_bbms_access:
+        # Unknown and unconfigured orgs keep getting the fallback from the backend
+        return False
+    etag, last_modified = donation_embed_validators(org)
+    entry = store_embed_page(org, render_donation_embed(org), etag, last_modified)
+    write_export_file(embed_export_path(org_id), entry["body"])
+    return True
+
+def export_static_assets() -> None:
+    for asset in static_assets.values():
+        body = asset["body"]
+        if not isinstance(body, PrecompressedBody):
+            continue
+        write_export_file(Path(EMBED_EXPORT_DIR) / "static" / asset["hashed_name"], body)
+
+async def export_all_embed_pages() -> int:
+    if not EMBED_EXPORT_DIR:
+        raise RuntimeError("EMBED_EXPORT_DIR is not set")
+    export_static_assets()
+    exported = 0
+    async for org in db["organizations"].find({}, {"id": 1}):
+        if await export_embed_page(org["id"]):
+            exported += 1
+    logging.info(f"Exported {exported} embed pages to {EMBED_EXPORT_DIR}")
+    return exported
+
+# "ensure" creates missing indexes at startup, "check" refuses to start when
+# any are missing or conflicting, "off" skips both (see indexes.py)
+INDEX_MODE = os.environ.get('INDEX_MODE', 'ensure').lower()
+
+@app.on_event("startup")
+async def ensure_indexes_on_startup():
+    if INDEX_MODE == "off":
+        return
+    report = await ensure_indexes(db, create=INDEX_MODE != "check")
+    if INDEX_MODE == "check" and not report.ok:
+        raise RuntimeError(
+            f"Required indexes missing or conflicting: {report.missing + report.conflicts}"
+        )
+
+embed_export_task: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def export_embeds_on_startup():
+    # Templates and bundle hashes may have changed with this deploy
+    global embed_export_task
+    if EMBED_EXPORT_DIR:
+        embed_export_task = asyncio.create_task(export_all_embed_pages())
+
+@app.on_event("startup")
+async def start_org_change_watcher():
+    if ORG_CHANGE_STREAM:
+        org_change_watcher.start()
+    else:
+        # Without the stream, cross-worker staleness is bounded by the short TTL
+        org_cache.ttl_seconds = min(org_cache.ttl_seconds, org_change_watcher.fallback_ttl_seconds)
+
+@app.on_event("shutdown")
+async def stop_org_change_watcher():
+    await org_change_watcher.stop()
+
+async def purge_expired_access_tokens():
+    # Lookups purge expired tokens too; this covers quiet periods
+    while True:
+        await asyncio.sleep(access_token_cache.ttl_seconds)
+        access_token_cache.purge_expired()
+
+access_token_purge_task: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def start_access_token_purge():
+    global access_token_purge_task
+    access_token_purge_task = asyncio.create_task(purge_expired_access_tokens())
+
+@app.on_event("shutdown")
+async def stop_access_token_purge():
+    access_token_cache.clear()
+    if access_token_purge_task:
+        access_token_purge_task.cancel()
+
+@api_router.get("/metrics/cache")
+async def get_cache_metrics():
+    """Size and hit-rate figures for the in-process caches"""
+    return {
+        "organizations": org_cache.stats(),
+        "embed_pages": {"size": len(embed_page_cache), "max_entries": EMBED_CACHE_MAX_ENTRIES},
+        "access_tokens": access_token_cache.stats(),
+        "change_stream": org_change_watcher.status()
+    }
+
+@api_router.get("/metrics/donation-writes")
+async def get_donation_write_metrics():
+    """Queue depth and flush latency of the donation write-behind pipeline"""
+    return {"enabled": DONATION_WRITE_BEHIND, **donation_writer.stats()}
+
+@api_router.get("/metrics/verification")
+async def get_verification_metrics():
+    """Worker and outcome counts of the transaction verification pool"""
+    pending = await db["donations"].count_documents({"status": PENDING_VERIFICATION})
+    return {"enabled": TRANSACTION_VERIFICATION, "pending": pending, **verification_pool.stats()}
+
+@api_router.post("/organizations/embed-export")
+async def export_my_embed_page(org_id: str = Depends(verify_token)):
+    """Re-export the current organization's embed page for nginx"""
+    if not EMBED_EXPORT_DIR:
+        raise HTTPException(400, "Static embed export is not enabled")
+    exported = await export_embed_page(org_id)
+    return {
+        "exported": exported,
+        "message": "Embed page exported" if exported else "Organization has no exportable embed page"
+    }
 
 # Include API router in app with higher priority
 app.include_router(api_router)
@@ -2756,172 +2414,7 @@ app.include_router(api_router)
 @app.get("/api/blackbaud-callback")
 async def oauth_callback_direct(code: str = None, state: str = None, error: str = None):
     """OAuth callback page that handles the redirect and posts back to API"""
-    return HTMLResponse(f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="utf-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1">
-        <title>Blackbaud Authentication</title>
-        <script src="https://cdn.tailwindcss.com"></script>
-    </head>
-    <body class="bg-gray-50 flex items-center justify-center min-h-screen">
-        <div class="bg-white rounded-lg shadow-lg p-8 max-w-md w-full mx-4">
-            <div id="loading" class="text-center">
-                <div class="animate-spin rounded-full h-12 w-12 border-b-2 border-blue-600 mx-auto mb-4"></div>
-                <h2 class="text-xl font-semibold text-gray-800 mb-2">Connecting to Blackbaud...</h2>
-                <p class="text-gray-600">Please wait while we complete the authentication.</p>
-                <div id="debug-info" class="mt-4 text-xs text-gray-500 bg-gray-100 p-2 rounded">
-                    <strong>🔍 OAuth Callback Debug Info:</strong><br>
-                    Code: <span class="font-mono">{code or 'Missing'}</span><br>
-                    State: <span class="font-mono">{state[:30] + '...' if state else 'Missing'}</span><br>
-                    Error: <span class="font-mono">{error or 'None'}</span>
-                </div>
-            </div>
-            
-            <div id="success" class="hidden text-center">
-                <div class="text-green-500 text-4xl mb-4">✅</div>
-                <h2 class="text-xl font-semibold text-gray-800 mb-2">Authentication Successful!</h2>
-                <p class="text-gray-600 mb-4">Your Blackbaud account has been connected.</p>
-                <button onclick="closeWindow()" class="bg-blue-600 text-white px-6 py-2 rounded-md hover:bg-blue-700">
-                    Continue
-                </button>
-            </div>
-            
-            <div id="error" class="hidden text-center">
-                <div class="text-red-500 text-4xl mb-4">❌</div>
-                <h2 class="text-xl font-semibold text-gray-800 mb-2">Authentication Failed</h2>
-                <p class="text-gray-600 mb-4" id="error-message">Something went wrong during authentication.</p>
-                <div id="error-details" class="text-xs text-gray-500 mb-4 bg-red-50 p-2 rounded font-mono"></div>
-                <button onclick="closeWindow()" class="bg-gray-600 text-white px-6 py-2 rounded-md hover:bg-gray-700">
-                    Close and Try Again
-                </button>
-            </div>
-        </div>
-        
-        <script>
-            console.log('🚀 OAuth Callback Page Loaded Successfully');
-            console.log('Current URL:', window.location.href);
-            
-            const urlParams = new URLSearchParams(window.location.search);
-            const code = urlParams.get('code') || '{code}';
-            const state = urlParams.get('state') || '{state}';
-            const error = urlParams.get('error') || '{error}';
-            
-            console.log('📋 Parameters received:', {{
-                code: code ? 'present (' + code.length + ' chars)' : 'missing',
-                state: state ? 'present (' + state.length + ' chars)' : 'missing',
-                error: error || 'none'
-            }});
-            
-            function showSuccess() {{
-                console.log('✅ Showing success state');
-                document.getElementById('loading').classList.add('hidden');
-                document.getElementById('success').classList.remove('hidden');
-            }}
-            
-            function showError(message, details = '') {{
-                console.error('❌ Error occurred:', message, details);
-                document.getElementById('loading').classList.add('hidden');
-                document.getElementById('error').classList.remove('hidden');
-                document.getElementById('error-message').textContent = message;
-                if (details) {{
-                    document.getElementById('error-details').textContent = details;
-                }}
-            }}
-            
-            function closeWindow() {{
-                console.log('🔄 Closing window and notifying parent...');
-                if (window.opener) {{
-                    const success = !document.getElementById('error').classList.contains('hidden');
-                    const errorMsg = success ? null : document.getElementById('error-message').textContent;
-                    
-                    console.log('📤 Sending message to parent:', {{ success, error: errorMsg }});
-                    
-                    window.opener.postMessage({{
-                        type: 'BLACKBAUD_AUTH_COMPLETE',
-                        success: success,
-                        error: errorMsg
-                    }}, '*');
-                    
-                    setTimeout(() => {{
-                        console.log('🔄 Closing popup window...');
-                        window.close();
-                    }}, 500);
-                }} else {{
-                    console.log('ℹ️ No opener window found, redirecting to main app');
-                    window.location.href = '/';
-                }}
-            }}
-            
-            async function handleCallback() {{
-                console.log('🔄 Starting OAuth callback processing...');
-                
-                if (error && error !== 'None') {{
-                    console.error('❌ OAuth error from Blackbaud:', error);
-                    showError(`Blackbaud OAuth Error: ${{error}}`);
-                    return;
-                }}
-                
-                if (!code || code === 'Missing' || !state || state === 'Missing') {{
-                    console.error('❌ Missing required OAuth parameters');
-                    showError('Missing authorization code or state parameter from Blackbaud.');
-                    return;
-                }}
-                
-                try {{
-                    const merchant_id = localStorage.getItem('bb_merchant_id') || '96563c2e-c97a-4db1-a0ed-1b2a8219f110';
-                    
-                    console.log('📡 Making API call to process OAuth callback...');
-                    console.log('🔍 Request details:', {{
-                        merchant_id: merchant_id,
-                        state_preview: state.substring(0, 30) + '...',
-                        code_preview: code.substring(0, 10) + '...'
-                    }});
-                    
-                    const response = await fetch('/api/organizations/bbms-oauth/callback', {{
-                        method: 'POST',
-                        headers: {{
-                            'Content-Type': 'application/json'
-                        }},
-                        body: JSON.stringify({{
-                            code: code,
-                            state: state,
-                            merchant_id: merchant_id
-                        }})
-                    }});
-                    
-                    console.log('📡 API Response status:', response.status);
-                    
-                    if (response.ok) {{
-                        const result = await response.json();
-                        console.log('✅ OAuth callback successful:', result);
-                        localStorage.removeItem('bb_merchant_id');
-                        showSuccess();
-                    }} else {{
-                        const errorData = await response.json();
-                        console.error('❌ API Error:', errorData);
-                        
-                        let errorMessage = errorData.detail || 'Authentication failed';
-                        if (errorMessage.includes('invalid_grant')) {{
-                            errorMessage = 'Authorization code expired. Please try the OAuth flow again quickly.';
-                        }}
-                        
-                        showError(errorMessage, `Status: ${{response.status}} - ${{JSON.stringify(errorData)}}`);
-                    }}
-                }} catch (err) {{
-                    console.error('❌ Network error:', err);
-                    showError('Network error during authentication', err.message);
-                }}
-            }}
-            
-            // Start processing immediately when page loads
-            console.log('🚀 Initiating OAuth callback processing...');
-            handleCallback();
-        </script>
-    </body>
-    </html>
-    """)
+    return render_oauth_callback_page(code, state, error)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
@@ -0,0 +1,50 @@
+// Loads the Blackbaud Checkout SDK on demand. Most embed views never reach the
+// payment step, so the page only preconnects to payments.blackbaud.com and the
+// SDK is injected once the donor starts interacting with the form.
+const CHECKOUT_SDK_URL = 'https://payments.blackbaud.com/Checkout/bbCheckout.2.0.js';
+let checkoutSdkPromise = null;
+
+// Resolves once Blackbaud_OpenPaymentForm is available; the submit path awaits this
+function loadCheckoutSdk() {
+    if (!checkoutSdkPromise) {
+        checkoutSdkPromise = new Promise(function(resolve, reject) {
+            if (typeof Blackbaud_OpenPaymentForm !== 'undefined') {
+                resolve();
+                return;
+            }
+            const script = document.createElement('script');
+            script.src = CHECKOUT_SDK_URL;
+            script.async = true;
+            script.onload = function() {
+                console.log('Blackbaud Checkout SDK loaded');
+                resolve();
+            };
+            script.onerror = function() {
+                // Let the next attempt retry instead of caching the failure
+                checkoutSdkPromise = null;
+                script.remove();
+                reject(new Error('Blackbaud Checkout SDK failed to load'));
+            };
+            document.head.appendChild(script);
+        });
+    }
+    return checkoutSdkPromise;
+}
+
+// Start loading the SDK on the donor's first interaction (amount click or focus)
+function loadCheckoutSdkOnInteraction(form) {
+    let started = false;
+    function start() {
+        if (started) {
+            return;
+        }
+        started = true;
+        form.removeEventListener('pointerdown', start, true);
+        form.removeEventListener('focusin', start);
+        loadCheckoutSdk().catch(function(error) {
+            console.warn(error.message);
+        });
+    }
+    form.addEventListener('pointerdown', start, true);
+    form.addEventListener('focusin', start);
+}
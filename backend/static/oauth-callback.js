@@ -0,0 +1,121 @@
+console.log('🚀 OAuth Callback Page Loaded Successfully');
+console.log('Current URL:', window.location.href);
+
+// Query parameters as the backend saw them, used when the URL has been rewritten
+const CALLBACK_PARAMS = JSON.parse(document.getElementById('callback-params').textContent);
+
+const urlParams = new URLSearchParams(window.location.search);
+const code = urlParams.get('code') || CALLBACK_PARAMS.code;
+const state = urlParams.get('state') || CALLBACK_PARAMS.state;
+const error = urlParams.get('error') || CALLBACK_PARAMS.error;
+
+console.log('📋 Parameters received:', {
+    code: code ? 'present (' + code.length + ' chars)' : 'missing',
+    state: state ? 'present (' + state.length + ' chars)' : 'missing',
+    error: error || 'none'
+});
+
+function showSuccess() {
+    console.log('✅ Showing success state');
+    document.getElementById('loading').classList.add('hidden');
+    document.getElementById('success').classList.remove('hidden');
+}
+
+function showError(message, details = '') {
+    console.error('❌ Error occurred:', message, details);
+    document.getElementById('loading').classList.add('hidden');
+    document.getElementById('error').classList.remove('hidden');
+    document.getElementById('error-message').textContent = message;
+    if (details) {
+        document.getElementById('error-details').textContent = details;
+    }
+}
+
+function closeWindow() {
+    console.log('🔄 Closing window and notifying parent...');
+    if (window.opener) {
+        const success = !document.getElementById('error').classList.contains('hidden');
+        const errorMsg = success ? null : document.getElementById('error-message').textContent;
+
+        console.log('📤 Sending message to parent:', { success, error: errorMsg });
+
+        window.opener.postMessage({
+            type: 'BLACKBAUD_AUTH_COMPLETE',
+            success: success,
+            error: errorMsg
+        }, '*');
+
+        setTimeout(() => {
+            console.log('🔄 Closing popup window...');
+            window.close();
+        }, 500);
+    } else {
+        console.log('ℹ️ No opener window found, redirecting to main app');
+        window.location.href = '/';
+    }
+}
+
+async function handleCallback() {
+    console.log('🔄 Starting OAuth callback processing...');
+
+    if (error && error !== 'None') {
+        console.error('❌ OAuth error from Blackbaud:', error);
+        showError(`Blackbaud OAuth Error: ${error}`);
+        return;
+    }
+
+    if (!code || code === 'Missing' || !state || state === 'Missing') {
+        console.error('❌ Missing required OAuth parameters');
+        showError('Missing authorization code or state parameter from Blackbaud.');
+        return;
+    }
+
+    try {
+        const merchant_id = localStorage.getItem('bb_merchant_id') || '96563c2e-c97a-4db1-a0ed-1b2a8219f110';
+
+        console.log('📡 Making API call to process OAuth callback...');
+        console.log('🔍 Request details:', {
+            merchant_id: merchant_id,
+            state_preview: state.substring(0, 30) + '...',
+            code_preview: code.substring(0, 10) + '...'
+        });
+
+        const response = await fetch('/api/organizations/bbms-oauth/callback', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                code: code,
+                state: state,
+                merchant_id: merchant_id
+            })
+        });
+
+        console.log('📡 API Response status:', response.status);
+
+        if (response.ok) {
+            const result = await response.json();
+            console.log('✅ OAuth callback successful:', result);
+            localStorage.removeItem('bb_merchant_id');
+            showSuccess();
+        } else {
+            const errorData = await response.json();
+            console.error('❌ API Error:', errorData);
+
+            let errorMessage = errorData.detail || 'Authentication failed';
+            if (errorMessage.includes('invalid_grant')) {
+                errorMessage = 'Authorization code expired. Please try the OAuth flow again quickly.';
+            }
+
+            showError(errorMessage, `Status: ${response.status} - ${JSON.stringify(errorData)}`);
+        }
+    } catch (err) {
+        console.error('❌ Network error:', err);
+        showError('Network error during authentication', err.message);
+    }
+}
+
+// Start processing immediately when page loads
+console.log('🚀 Initiating OAuth callback processing...');
+handleCallback();
@@ -0,0 +1,78 @@
+"""Short-lived cache of decrypted Blackbaud access tokens, keyed by ciphertext.
+
+Plaintext buffers are zeroed when an entry expires, is evicted or its
+organization is invalidated. The str returned to callers can't be wiped.
+"""
+import time
+from collections import OrderedDict
+from typing import Callable, Dict
+
+
+def _wipe(buffer: bytearray) -> None:
+    buffer[:] = bytes(len(buffer))
+
+
+class DecryptedTokenCache:
+    def __init__(
+        self,
+        decrypt: Callable[[str], str],
+        max_entries: int = 256,
+        ttl_seconds: float = 300.0,
+    ):
+        self.decrypt = decrypt
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # ciphertext -> (expires_at, org_id, plaintext buffer), oldest first
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, ciphertext: str, org_id: str) -> str:
+        self.purge_expired()
+        entry = self._entries.get(ciphertext)
+        if entry is not None:
+            self.hits += 1
+            return entry[2].decode()
+
+        self.misses += 1
+        plaintext = self.decrypt(ciphertext)
+        if self.max_entries > 0:
+            self._entries[ciphertext] = (time.monotonic() + self.ttl_seconds, org_id, bytearray(plaintext.encode()))
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+        return plaintext
+
+    def _discard(self, ciphertext: str) -> None:
+        entry = self._entries.pop(ciphertext, None)
+        if entry is not None:
+            _wipe(entry[2])
+
+    def purge_expired(self) -> None:
+        now = time.monotonic()
+        while self._entries:
+            ciphertext, (expires_at, _, _) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            self._discard(ciphertext)
+
+    def invalidate_org(self, org_id: str) -> None:
+        for ciphertext in [key for key, entry in self._entries.items() if entry[1] == org_id]:
+            self._discard(ciphertext)
+
+    def clear(self) -> None:
+        for ciphertext in list(self._entries):
+            self._discard(ciphertext)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,179 @@
+"""Background verification of Blackbaud transaction tokens.
+
+process-transaction records a donation as pending_verification and returns
+right away; a pool of asyncio workers then verifies the token with Blackbaud
+and moves the donation to completed or failed. The donations collection is the
+job queue: a pending donation carries a "verification" subdocument with its
+attempt count, when it may next be tried and a lease. Because the job is the
+donation record itself, enqueueing costs no extra write (and goes through the
+write-behind journal like any other donation), and any worker in any process
+can claim it. A worker that dies mid-verification just lets its lease expire.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+
+PENDING = "pending_verification"
+COMPLETED = "completed"
+FAILED = "failed"
+# Gave up after max_attempts transient errors; needs a human to reconcile
+VERIFICATION_FAILED = "verification_failed"
+
+
+class VerificationError(Exception):
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def new_verification_state(now: Optional[datetime] = None) -> Dict:
+    """The verification subdocument for a donation that still has to be verified"""
+    now = now or datetime.utcnow()
+    return {"attempts": 0, "next_attempt_at": now, "locked_until": now, "last_error": None}
+
+
+class VerificationWorkerPool:
+    def __init__(
+        self,
+        get_collection: Callable,
+        verify: Callable[[dict], Awaitable[Dict]],
+        concurrency: int = 4,
+        max_attempts: int = 5,
+        lease_seconds: float = 120.0,
+        base_retry_delay: float = 5.0,
+        max_retry_delay: float = 600.0,
+        poll_interval: float = 2.0,
+        on_completed: Optional[Callable[[dict], Awaitable]] = None,
+    ):
+        self.get_collection = get_collection
+        self.verify = verify
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.base_retry_delay = base_retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.poll_interval = poll_interval
+        self.on_completed = on_completed
+        self._workers = []
+        self._wakeup = asyncio.Event()
+        self.busy = 0
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.gave_up = 0
+
+    def start(self) -> None:
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def notify(self) -> None:
+        """A donation was queued; wake an idle worker instead of waiting for the next poll"""
+        self._wakeup.set()
+
+    def stats(self) -> Dict:
+        return {
+            "workers": len(self._workers),
+            "busy": self.busy,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "gave_up": self.gave_up,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                donation = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Claiming a verification job failed: {e}")
+                donation = None
+            if donation is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self.busy += 1
+            try:
+                await self._process(donation)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The lease runs out and another worker picks the job up again
+                logging.error(f"Verification of donation {donation.get('id')} crashed: {e}")
+            finally:
+                self.busy -= 1
+
+    async def _claim(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await self.get_collection().find_one_and_update(
+            {
+                "status": PENDING,
+                "verification.next_attempt_at": {"$lte": now},
+                "verification.locked_until": {"$lte": now},
+            },
+            {
+                "$set": {"verification.locked_until": now + timedelta(seconds=self.lease_seconds)},
+                "$inc": {"verification.attempts": 1},
+            },
+            sort=[("verification.next_attempt_at", 1)],
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _process(self, donation: dict) -> None:
+        attempts = donation["verification"]["attempts"]
+        try:
+            result = await self.verify(donation)
+        except VerificationError as e:
+            if e.retryable and attempts < self.max_attempts:
+                delay = min(self.base_retry_delay * 2 ** (attempts - 1), self.max_retry_delay)
+                logging.warning(f"Verification of donation {donation['id']} failed (attempt {attempts}), retrying in {delay}s: {e}")
+                self.retried += 1
+                await self._finish(donation, {
+                    "verification.next_attempt_at": datetime.utcnow() + timedelta(seconds=delay),
+                    "verification.locked_until": datetime.utcnow(),
+                    "verification.last_error": str(e),
+                })
+                return
+            status = FAILED if not e.retryable else VERIFICATION_FAILED
+            logging.error(f"Verification of donation {donation['id']} ended as {status}: {e}")
+            if status == FAILED:
+                self.failed += 1
+            else:
+                self.gave_up += 1
+            await self._finish(donation, {
+                "status": status,
+                "verification.last_error": str(e),
+                "verification.finished_at": datetime.utcnow(),
+            })
+            return
+        self.completed += 1
+        fields = {
+            "status": COMPLETED,
+            "verification.last_error": None,
+            "verification.finished_at": datetime.utcnow(),
+            **result,
+        }
+        # Only the worker whose update lands reports the completion
+        if await self._finish(donation, fields) and self.on_completed is not None:
+            await self.on_completed({**donation, "status": COMPLETED})
+
+    async def _finish(self, donation: dict, fields: Dict) -> bool:
+        result = await self.get_collection().update_one(
+            {"id": donation["id"], "status": PENDING},
+            {"$set": {**fields, "updated_at": datetime.utcnow()}},
+        )
+        return result.modified_count == 1
@@ -638,13 +638,13 @@ class BlackbaudOAuthTester:
         if not success:
             return False
             
-        # Check if we got a list of transactions
-        if not isinstance(response, list):
-            print("❌ Expected a list of transactions")
+        # Check if we got a page of transactions
+        if not isinstance(response.get("transactions"), list) or "has_more" not in response:
+            print("❌ Expected a page of transactions")
             return False
             
         print(f"✅ Organization transactions retrieved successfully")
-        print(f"✅ Number of transactions: {len(response)}")
+        print(f"✅ Number of transactions: {len(response['transactions'])} (more: {response['has_more']})")
         
         return True
 
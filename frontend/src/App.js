@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 import './App.css';
 
@@ -219,24 +219,16 @@ const Dashboard = ({ organization, authToken, setCurrentPage }) => {
 
   const fetchStats = async () => {
     try {
-      const response = await axios.get(`${API}/api/organizations/${organization.id}/transactions`, {
+      // Totals are aggregated server-side, so this stays small for any number of donations
+      const response = await axios.get(`${API}/api/organizations/${organization.id}/stats`, {
         headers: { Authorization: `Bearer ${authToken}` }
       });
-      const transactions = response.data;
-      
-      const completed = transactions.filter(t => t.status === 'completed');
-      const totalAmount = completed.reduce((sum, t) => sum + (t.amount || 0), 0);
-      const recentCount = completed.filter(t => {
-        const transactionDate = new Date(t.created_at);
-        const weekAgo = new Date();
-        weekAgo.setDate(weekAgo.getDate() - 7);
-        return transactionDate > weekAgo;
-      }).length;
+      const data = response.data;
 
       setStats({
-        totalDonations: completed.length,
-        totalAmount: totalAmount,
-        recentCount: recentCount
+        totalDonations: data.total_donations,
+        totalAmount: data.total_amount,
+        recentCount: data.recent_count
       });
     } catch (error) {
       console.error('Failed to fetch stats:', error);
@@ -1232,24 +1224,54 @@ const EmbedCode = ({ organization }) => {
 };
 
 // Transactions Component (Updated)
+const TRANSACTIONS_PAGE_SIZE = 50;
+
 const Transactions = ({ organization, authToken }) => {
   const [transactions, setTransactions] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [hasMore, setHasMore] = useState(false);
+  const sentinelRef = useRef(null);
+  const fetchingRef = useRef(false);
 
   useEffect(() => {
     fetchTransactions();
   }, []);
 
-  const fetchTransactions = async () => {
+  // Load the next page when the row after the last one scrolls into view
+  useEffect(() => {
+    if (!hasMore || !sentinelRef.current) return;
+    const observer = new IntersectionObserver((entries) => {
+      if (entries[0].isIntersecting) {
+        fetchTransactions(nextCursor);
+      }
+    }, { rootMargin: '200px' });
+    observer.observe(sentinelRef.current);
+    return () => observer.disconnect();
+  }, [hasMore, nextCursor]);
+
+  const fetchTransactions = async (cursor = null) => {
+    if (fetchingRef.current) return;
+    fetchingRef.current = true;
+    if (cursor) setLoadingMore(true);
     try {
+      const params = { limit: TRANSACTIONS_PAGE_SIZE };
+      if (cursor) params.cursor = cursor;
       const response = await axios.get(`${API}/api/organizations/${organization.id}/transactions`, {
-        headers: { Authorization: `Bearer ${authToken}` }
+        headers: { Authorization: `Bearer ${authToken}` },
+        params
       });
-      setTransactions(response.data);
+      const page = response.data;
+      setTransactions(previous => cursor ? [...previous, ...page.transactions] : page.transactions);
+      setNextCursor(page.next_cursor);
+      setHasMore(page.has_more);
     } catch (error) {
       console.error('Failed to fetch transactions:', error);
     } finally {
+      fetchingRef.current = false;
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
@@ -1380,6 +1402,13 @@ const Transactions = ({ organization, authToken }) => {
                 ))}
               </tbody>
             </table>
+            {hasMore && (
+              <div ref={sentinelRef} className="flex justify-center py-4">
+                {loadingMore && (
+                  <div className="animate-spin rounded-full h-6 w-6 border-b-2 border-blue-600"></div>
+                )}
+              </div>
+            )}
           </div>
         )}
       </div>
@@ -0,0 +1,14 @@
+/** @type {import('tailwindcss').Config} */
+// Stylesheet for the backend-served pages (donation embeds, OAuth callback,
+// developer instructions). Built by `yarn build:embed-css` into
+// backend/static/embed.css so those pages don't compile CSS in the browser.
+module.exports = {
+  content: [
+    "../backend/static/*.js",
+    "../backend/server.py"
+  ],
+  theme: {
+    extend: {},
+  },
+  plugins: [],
+};
@@ -0,0 +1,61 @@
+import asyncio
+
+from donation_import import MAX_LINE_LENGTH, MAX_RECORD_LENGTH, iter_csv_rows, iter_lines, iter_ndjson_rows
+
+
+async def chunked(data, size=7):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def collect(rows):
+    async def run():
+        return [row async for row in rows]
+
+    return asyncio.run(run())
+
+
+def test_lines_split_across_chunks():
+    data = "\ufeffa,b\r\né,ü\n\nlast".encode()
+    assert collect(iter_lines(chunked(data, 3))) == ["a,b", "é,ü", "", "last"]
+
+
+def test_overlong_line_is_an_error_and_the_next_line_is_read():
+    data = b"x" * (MAX_LINE_LENGTH + 10) + b"\nnext\n"
+    lines = collect(iter_lines(chunked(data, 4096)))
+    assert isinstance(lines[0], ValueError)
+    assert lines[1:] == ["next"]
+
+
+def test_upload_without_newlines_yields_one_error():
+    lines = collect(iter_lines(chunked(b"x" * (4 * MAX_LINE_LENGTH), 4096)))
+    assert len(lines) == 1 and isinstance(lines[0], ValueError)
+
+
+def test_ndjson_reports_line_numbers():
+    data = b'{"amount": 5}\nnot json\n\n' + b"y" * (MAX_LINE_LENGTH + 1) + b'\n{"amount": 6}\n'
+    rows = collect(iter_ndjson_rows(chunked(data, 1024)))
+    assert [line for line, _ in rows] == [1, 2, 4, 5]
+    assert rows[0][1] == {"amount": 5} and rows[3][1] == {"amount": 6}
+    assert isinstance(rows[1][1], ValueError) and isinstance(rows[2][1], ValueError)
+
+
+def test_csv_quoted_fields_may_span_lines():
+    data = 'amount,donor_name\n5,"Multi\nLine, ""quoted"""\n6,\n'.encode()
+    rows = collect(iter_csv_rows(chunked(data)))
+    assert rows == [(2, {"amount": "5", "donor_name": 'Multi\nLine, "quoted"'}), (4, {"amount": "6"})]
+
+
+def test_csv_unmatched_quote_is_bounded():
+    lines = 2 * MAX_RECORD_LENGTH // 10
+    data = b'amount,donor_name\n5,"unmatched\n' + b"6,donor\n" * lines
+    rows = collect(iter_csv_rows(chunked(data, 65536)))
+    line, error = rows[0]
+    assert line == 2 and isinstance(error, ValueError)
+    # Reading resumes after the runaway record instead of swallowing the upload
+    assert rows[-1][1] == {"amount": "6", "donor_name": "donor"}
+
+
+def test_csv_unterminated_quote_at_end():
+    rows = collect(iter_csv_rows(chunked(b'amount\n"5\n')))
+    assert rows[0][0] == 2 and isinstance(rows[0][1], ValueError)
@@ -0,0 +1,37 @@
+import base64
+from datetime import datetime
+
+import pytest
+
+from donation_store import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trips_datetime_position():
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 123000)
+    cursor = encode_cursor({"id": "donation-1", "created_at": created_at, "amount_cents": 500})
+    assert decode_cursor(cursor) == (created_at, "donation-1")
+
+
+def test_cursor_keeps_legacy_string_created_at():
+    cursor = encode_cursor({"id": "donation-1", "created_at": "2023-02-01T09:00:00"})
+    assert decode_cursor(cursor) == ("2023-02-01T09:00:00", "donation-1")
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor({"id": "?&/+=" * 5, "created_at": datetime(2024, 1, 1)})
+    assert all(character.isalnum() or character in "-_" for character in cursor)
+
+
+TRUNCATED = encode_cursor({"id": "donation-1", "created_at": datetime(2024, 1, 1)})[:-6]
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", "e30", TRUNCATED])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_cursor_with_non_string_id_is_rejected():
+    cursor = base64.urlsafe_b64encode(b'[{"$date": "2024-01-01T00:00:00Z"}, 5]').decode().rstrip("=")
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
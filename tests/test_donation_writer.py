@@ -0,0 +1,291 @@
+import asyncio
+import fcntl
+
+import bson
+from bson import json_util
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from donation_writer import DUPLICATE_KEY, JOURNAL_JSON_OPTIONS, DonationWriteBehind, already_inserted
+
+DOCUMENT_FAILED_VALIDATION = 121
+
+
+def duplicate_key(index, field):
+    return {"index": index, "code": DUPLICATE_KEY, "keyPattern": {field: 1}, "errmsg": "duplicate key"}
+
+
+class FakeCollection:
+    """insert_many with the unordered semantics and BulkWriteError details of Mongo"""
+
+    def __init__(self, fail_times=0):
+        self.docs = {}
+        self.fail_times = fail_times
+        self.calls = 0
+
+    async def insert_many(self, records, ordered=True):
+        self.calls += 1
+        if self.fail_times:
+            self.fail_times -= 1
+            raise AutoReconnect("mongo unavailable")
+        # Like the driver, refuse the whole call if any document can't be encoded
+        for record in records:
+            bson.encode(record)
+        errors = []
+        for index, record in enumerate(records):
+            token = record.get("transaction_token")
+            if record["id"] in self.docs:
+                errors.append(duplicate_key(index, "id"))
+            elif token is not None and any(doc.get("transaction_token") == token for doc in self.docs.values()):
+                errors.append(duplicate_key(index, "transaction_token"))
+            elif record.get("invalid"):
+                errors.append({"index": index, "code": DOCUMENT_FAILED_VALIDATION, "errmsg": "failed validation"})
+            else:
+                self.docs[record["id"]] = dict(record)
+        if errors:
+            inserted = len(records) - len(errors)
+            raise BulkWriteError({"writeErrors": errors, "writeConcernErrors": [], "nInserted": inserted})
+
+
+def make_writer(collection, journal_dir, **options):
+    inserted = []
+
+    async def on_inserted(records):
+        inserted.extend(records)
+
+    options.setdefault("flush_interval", 0.001)
+    options.setdefault("retry_delay", 0.01)
+    writer = DonationWriteBehind(lambda: collection, journal_dir, on_inserted=on_inserted, **options)
+    return writer, inserted
+
+
+def write_segment(path, records, torn_tail=b""):
+    with open(path, "wb") as file:
+        for record in records:
+            file.write(json_util.dumps(record, json_options=JOURNAL_JSON_OPTIONS).encode() + b"\n")
+        file.write(torn_tail)
+
+
+async def wait_for_flush(writer, timeout=2.0):
+    for _ in range(int(timeout / 0.005)):
+        if not writer.queue and not writer._sync_batch:
+            return
+        await asyncio.sleep(0.005)
+    raise AssertionError(f"{len(writer.queue)} records still queued")
+
+
+def journal_segments(journal_dir):
+    return sorted(path.name for path in journal_dir.glob("donations-*.jsonl"))
+
+
+def test_replays_segment_left_by_dead_process(tmp_path):
+    records = [{"id": f"d{index}", "amount_cents": 100 * index} for index in range(3)]
+    write_segment(tmp_path / "donations-4242-0-1.jsonl", records)
+
+    async def run():
+        collection = FakeCollection()
+        writer, inserted = make_writer(collection, tmp_path)
+        await writer.start()
+        await wait_for_flush(writer)
+        await writer.stop()
+        return collection, writer, inserted
+
+    collection, writer, inserted = asyncio.run(run())
+    assert sorted(collection.docs) == ["d0", "d1", "d2"]
+    assert writer.replayed == 3
+    assert [record["id"] for record in inserted] == ["d0", "d1", "d2"]
+    assert journal_segments(tmp_path) == []
+
+
+def test_skips_segment_locked_by_live_process(tmp_path):
+    path = tmp_path / "donations-4242-0-1.jsonl"
+    write_segment(path, [{"id": "d0"}])
+
+    async def run():
+        collection = FakeCollection()
+        writer, _ = make_writer(collection, tmp_path)
+        await writer.start()
+        await writer.stop()
+        return collection, writer
+
+    with open(path, "ab") as live:
+        fcntl.flock(live.fileno(), fcntl.LOCK_EX)
+        collection, writer = asyncio.run(run())
+    assert collection.docs == {}
+    assert writer.replayed == 0
+    assert path.exists()
+
+
+def test_torn_last_line_is_not_replayed(tmp_path):
+    torn = json_util.dumps({"id": "d2"}, json_options=JOURNAL_JSON_OPTIONS).encode()[:-3]
+    write_segment(tmp_path / "donations-4242-0-1.jsonl", [{"id": "d0"}, {"id": "d1"}], torn_tail=torn)
+
+    async def run():
+        collection = FakeCollection()
+        writer, _ = make_writer(collection, tmp_path)
+        await writer.start()
+        await wait_for_flush(writer)
+        await writer.stop()
+        return collection, writer
+
+    collection, writer = asyncio.run(run())
+    assert sorted(collection.docs) == ["d0", "d1"]
+    assert writer.replayed == 2
+    assert journal_segments(tmp_path) == []
+
+
+def test_submit_round_trips_through_the_journal(tmp_path):
+    from datetime import datetime
+
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 123000)
+
+    async def run():
+        collection = FakeCollection()
+        writer, _ = make_writer(collection, tmp_path)
+        await writer.start()
+        await writer.submit({"id": "d0", "amount_cents": 2500, "created_at": created_at})
+        await wait_for_flush(writer)
+        await writer.stop()
+        return collection
+
+    assert asyncio.run(run()).docs["d0"] == {"id": "d0", "amount_cents": 2500, "created_at": created_at}
+
+
+def test_same_worker_retry_returns_queued_record(tmp_path):
+    async def run():
+        collection = FakeCollection()
+        writer, _ = make_writer(collection, tmp_path)
+        await writer.start()
+        first, second = await asyncio.gather(
+            writer.submit({"id": "d0", "token": "t"}, keys=("org:t", "d0")),
+            writer.submit({"id": "d1", "token": "t"}, keys=("org:t", "d1")),
+        )
+        pending = writer.pending("org:t")
+        await wait_for_flush(writer)
+        after_flush = writer.pending("org:t")
+        await writer.stop()
+        return collection, writer, first, second, pending, after_flush
+
+    collection, writer, first, second, pending, after_flush = asyncio.run(run())
+    assert second is first
+    assert pending is first
+    assert after_flush is None
+    assert writer.journaled == 1
+    assert list(collection.docs) == ["d0"]
+
+
+def test_partial_duplicate_batch_retires_segment(tmp_path):
+    write_segment(tmp_path / "donations-4242-0-1.jsonl", [{"id": "d0"}, {"id": "d1"}, {"id": "d2"}])
+
+    async def run():
+        collection = FakeCollection()
+        # d1 reached Mongo before the process died
+        collection.docs["d1"] = {"id": "d1"}
+        writer, inserted = make_writer(collection, tmp_path)
+        await writer.start()
+        await wait_for_flush(writer)
+        await writer.stop()
+        return collection, writer, inserted
+
+    collection, writer, inserted = asyncio.run(run())
+    assert sorted(collection.docs) == ["d0", "d1", "d2"]
+    assert writer.duplicates_skipped == 1
+    assert [record["id"] for record in inserted] == ["d0", "d2"]
+    assert journal_segments(tmp_path) == []
+
+
+def test_duplicate_token_from_another_worker_is_dead_lettered(tmp_path):
+    async def run():
+        collection = FakeCollection()
+        # Recorded by another worker under its own donation id
+        collection.docs["other"] = {"id": "other", "transaction_token": "t"}
+        writer, inserted = make_writer(collection, tmp_path)
+        await writer.start()
+        await writer.submit({"id": "d0", "transaction_token": "t"})
+        await wait_for_flush(writer)
+        await writer.stop()
+        return collection, writer, inserted
+
+    collection, writer, inserted = asyncio.run(run())
+    assert "d0" not in collection.docs
+    assert inserted == []
+    assert writer.duplicates_skipped == 0
+    assert writer.dead_lettered == 1
+
+
+def test_already_inserted_falls_back_to_index_name():
+    message = 'E11000 duplicate key error collection: db.donations index: {} dup key: {{ x: "1" }}'
+    assert already_inserted({"code": DUPLICATE_KEY, "errmsg": message.format("id_unique")})
+    assert not already_inserted({"code": DUPLICATE_KEY, "errmsg": message.format("transaction_token_unique")})
+    assert not already_inserted({"code": 121, "keyPattern": {"id": 1}})
+
+
+def test_transient_failure_retries_batch(tmp_path):
+    async def run():
+        collection = FakeCollection(fail_times=2)
+        writer, _ = make_writer(collection, tmp_path)
+        await writer.start()
+        await writer.submit({"id": "d0"})
+        await wait_for_flush(writer)
+        await writer.stop()
+        return collection, writer
+
+    collection, writer = asyncio.run(run())
+    assert list(collection.docs) == ["d0"]
+    assert writer.flush_failures == 2
+    assert journal_segments(tmp_path) == []
+
+
+def test_rejected_record_is_dead_lettered_without_blocking_queue(tmp_path):
+    async def run():
+        collection = FakeCollection()
+        writer, inserted = make_writer(collection, tmp_path)
+        await writer.start()
+        await asyncio.gather(
+            writer.submit({"id": "d0"}),
+            writer.submit({"id": "bad", "invalid": True}, keys=("bad",)),
+            writer.submit({"id": "d1"}),
+        )
+        await wait_for_flush(writer)
+        await writer.submit({"id": "d2"})
+        await wait_for_flush(writer)
+        pending = writer.pending("bad")
+        await writer.stop()
+        return collection, writer, inserted, pending
+
+    collection, writer, inserted, pending = asyncio.run(run())
+    assert sorted(collection.docs) == ["d0", "d1", "d2"]
+    assert sorted(record["id"] for record in inserted) == ["d0", "d1", "d2"]
+    assert writer.dead_lettered == 1
+    assert writer.flush_failures == 0
+    assert pending is None
+    assert journal_segments(tmp_path) == []
+    (dead_letter,) = tmp_path.glob("dead-letter-*.jsonl")
+    (entry,) = [json_util.loads(line) for line in dead_letter.read_text().splitlines()]
+    assert entry["record"]["id"] == "bad"
+    assert entry["code"] == DOCUMENT_FAILED_VALIDATION
+
+
+def test_unencodable_record_is_dead_lettered_without_blocking_queue(tmp_path):
+    async def run():
+        collection = FakeCollection()
+        writer, inserted = make_writer(collection, tmp_path)
+        await writer.start()
+        await asyncio.gather(
+            writer.submit({"id": "d0"}),
+            writer.submit({"id": "huge", "amount_cents": 10 ** 22}),
+            writer.submit({"id": "d1"}),
+        )
+        await wait_for_flush(writer)
+        await writer.stop()
+        return collection, writer, inserted
+
+    collection, writer, inserted = asyncio.run(run())
+    assert sorted(collection.docs) == ["d0", "d1"]
+    assert sorted(record["id"] for record in inserted) == ["d0", "d1"]
+    assert writer.dead_lettered == 1
+    assert writer.flush_failures == 0
+    assert journal_segments(tmp_path) == []
+    (dead_letter,) = tmp_path.glob("dead-letter-*.jsonl")
+    (entry,) = [json_util.loads(line) for line in dead_letter.read_text().splitlines()]
+    assert entry["record"]["id"] == "huge"
+    assert "OverflowError" in entry["error"]
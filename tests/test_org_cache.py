@@ -0,0 +1,159 @@
+import asyncio
+
+from org_cache import OrgCache
+
+
+class FakeLoader:
+    def __init__(self, docs=None, delay=0.01):
+        self.docs = docs if docs is not None else {}
+        self.delay = delay
+        self.calls = []
+
+    async def __call__(self, org_id, view):
+        self.calls.append((org_id, view))
+        # Read before waiting, like a query that has already hit the server
+        doc = self.docs.get(org_id)
+        await asyncio.sleep(self.delay)
+        return doc
+
+
+def test_concurrent_misses_share_one_load():
+    async def run():
+        loader = FakeLoader({"org-1": {"id": "org-1"}})
+        cache = OrgCache(loader)
+        results = await asyncio.gather(*(cache.get("org-1") for _ in range(20)))
+        return loader, cache, results
+
+    loader, cache, results = asyncio.run(run())
+    assert loader.calls == [("org-1", "full")]
+    assert all(result == {"id": "org-1"} for result in results)
+    assert cache.misses == 1
+    assert cache.coalesced == 19
+
+
+def test_views_are_loaded_separately():
+    async def run():
+        loader = FakeLoader({"org-1": {"id": "org-1"}})
+        cache = OrgCache(loader)
+        await asyncio.gather(cache.get("org-1", "embed"), cache.get("org-1", "form"))
+        await cache.get("org-1", "embed")
+        return loader, cache
+
+    loader, cache = asyncio.run(run())
+    assert sorted(loader.calls) == [("org-1", "embed"), ("org-1", "form")]
+    assert cache.hits == 1
+
+
+def test_cancelled_caller_does_not_cancel_shared_load():
+    async def run():
+        loader = FakeLoader({"org-1": {"id": "org-1"}}, delay=0.05)
+        cache = OrgCache(loader)
+        first = asyncio.ensure_future(cache.get("org-1"))
+        second = asyncio.ensure_future(cache.get("org-1"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return loader, await second
+
+    loader, result = asyncio.run(run())
+    assert result == {"id": "org-1"}
+    assert len(loader.calls) == 1
+
+
+def test_invalidation_during_load_is_not_cached():
+    async def run():
+        loader = FakeLoader({"org-1": {"id": "org-1", "version": 1}}, delay=0.05)
+        cache = OrgCache(loader)
+        stale = asyncio.ensure_future(cache.get("org-1"))
+        await asyncio.sleep(0.01)
+        loader.docs["org-1"] = {"id": "org-1", "version": 2}
+        cache.invalidate("org-1")
+        # Must not join the load that started before the write
+        fresh = await cache.get("org-1")
+        return loader, await stale, fresh, await cache.get("org-1")
+
+    loader, stale, fresh, cached = asyncio.run(run())
+    assert stale["version"] == 1
+    assert fresh["version"] == 2
+    assert cached["version"] == 2
+    assert len(loader.calls) == 2
+
+
+def test_loader_error_reaches_every_waiter_and_is_not_cached():
+    async def run():
+        calls = []
+
+        async def failing(org_id, view):
+            calls.append(org_id)
+            await asyncio.sleep(0.01)
+            if len(calls) == 1:
+                raise RuntimeError("mongo unavailable")
+            return {"id": org_id}
+
+        cache = OrgCache(failing)
+        results = await asyncio.gather(cache.get("org-1"), cache.get("org-1"), return_exceptions=True)
+        return calls, results, await cache.get("org-1")
+
+    calls, results, retried = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert retried == {"id": "org-1"}
+    assert len(calls) == 2
+
+
+def test_unknown_org_is_remembered():
+    async def run():
+        loader = FakeLoader()
+        cache = OrgCache(loader)
+        first = await cache.get("missing")
+        second = await cache.get("missing")
+        return loader, cache, first, second
+
+    loader, cache, first, second = asyncio.run(run())
+    assert first is None and second is None
+    assert len(loader.calls) == 1
+    assert cache.negative_hits == 1
+    assert cache.stats()["negative_size"] == 1
+
+
+def test_negative_entry_expires(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("org_cache.time.monotonic", lambda: now[0])
+
+    async def run():
+        loader = FakeLoader(delay=0)
+        cache = OrgCache(loader, ttl_seconds=60, negative_ttl_seconds=30)
+        await cache.get("missing")
+        now[0] += 29
+        await cache.get("missing")
+        now[0] += 2
+        await cache.get("missing")
+        return loader
+
+    assert len(asyncio.run(run()).calls) == 2
+
+
+def test_negative_entries_do_not_evict_organizations():
+    async def run():
+        loader = FakeLoader({"org-1": {"id": "org-1"}}, delay=0)
+        cache = OrgCache(loader, max_entries=1, negative_max_entries=2)
+        await cache.get("org-1")
+        for index in range(5):
+            await cache.get(f"missing-{index}")
+        await cache.get("org-1")
+        return loader, cache
+
+    loader, cache = asyncio.run(run())
+    assert loader.calls.count(("org-1", "full")) == 1
+    assert cache.stats()["negative_size"] == 2
+    assert cache.evictions == 0
+
+
+def test_invalidate_forgets_missing_org():
+    async def run():
+        loader = FakeLoader(delay=0)
+        cache = OrgCache(loader)
+        await cache.get("org-1")
+        loader.docs["org-1"] = {"id": "org-1"}
+        cache.invalidate("org-1")
+        return await cache.get("org-1")
+
+    assert asyncio.run(run()) == {"id": "org-1"}